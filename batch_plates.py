@@ -0,0 +1,164 @@
+"""Vectorized CLPT kernels that evaluate many thin laminates in one call.
+
+The ThinPlates class is convenient for looking at a single laminate in
+detail, but building one object per laminate is far too slow for design
+sweeps. The functions here work on padded (laminates x plies) arrays instead
+of Ply objects. Padding plies are given zero thickness, which removes them
+from every through-thickness integral.
+
+All orientations are in degrees, matching Ply.Orientation.
+"""
+import numpy as np
+
+def make_material_table(materials):
+    """Collects the properties of a list of Plate2D materials into arrays.
+
+    The returned dictionary is indexed by the material indices used in the
+    batch functions. Invariants come from Plate2D.make_invariants so that the
+    batched results are built from exactly the same numbers as ThinPlates.
+    """
+    U = np.array([matl.make_invariants() for matl in materials], dtype=float)
+    CTE = np.array([[float(matl.CTE_1), float(matl.CTE_2)] \
+                    for matl in materials], dtype=float)
+    density = np.array([matl.Density for matl in materials], dtype=float)
+    return {'U':U.reshape(-1,5), 'CTE':CTE.reshape(-1,2), 'Density':density}
+
+def make_ply_stiffness(orientations, material_index, table):
+    """Returns the global (Q-bar) ply stiffnesses and CTE vectors for an
+    array of plies of any shape.
+
+    The stiffness array has the input shape plus (3,3) and the CTE array has
+    the input shape plus (3,). Same invariant formulation as ThinPlates.
+    """
+    theta = np.radians(np.asarray(orientations, dtype=float))
+    idx = np.asarray(material_index, dtype=np.intp)
+    U = table['U'][idx]
+    CTE = table['CTE'][idx]
+
+    c4 = np.cos(4 * theta)
+    c2 = np.cos(2 * theta)
+    c1 = np.cos(theta)
+    s4 = np.sin(4 * theta)
+    s2 = np.sin(2 * theta)
+    s1 = np.sin(theta)
+
+    Q = np.empty(theta.shape + (3,3))
+    Q[...,0,0] = U[...,0] + U[...,1]*c2 + U[...,2]*c4
+    Q[...,1,1] = U[...,0] - U[...,1]*c2 + U[...,2]*c4
+    Q[...,0,1] = Q[...,1,0] = U[...,3] - U[...,2]*c4
+    Q[...,2,2] = U[...,4] - U[...,2]*c4
+    Q[...,0,2] = Q[...,2,0] = U[...,1]*s2/2 + U[...,2]*s4
+    Q[...,1,2] = Q[...,2,1] = U[...,1]*s2/2 - U[...,2]*s4
+
+    cte = np.empty(theta.shape + (3,))
+    cte[...,0] = CTE[...,0]*c1**2 + CTE[...,1]*s1**2
+    cte[...,1] = CTE[...,0]*s1**2 + CTE[...,1]*c1**2
+    # Shear CTE is an engineering strain, like the shear strain in ABD
+    cte[...,2] = 2*(CTE[...,0]-CTE[...,1])*c1*s1
+    return Q, cte
+
+def make_strain_transforms(orientations):
+    """Returns the matrices taking global strains to fibre coordinate strains
+    for an array of ply orientations, with shape input shape plus (3,3).
+
+    Shear strains are engineering strains on both sides.
+    """
+    theta = np.radians(np.asarray(orientations, dtype=float))
+    m = np.cos(theta)
+    n = np.sin(theta)
+    T = np.empty(theta.shape + (3,3))
+    T[...,0,:] = np.stack([m**2, n**2, m*n], axis=-1)
+    T[...,1,:] = np.stack([n**2, m**2, -m*n], axis=-1)
+    T[...,2,:] = np.stack([-2*m*n, 2*m*n, m**2-n**2], axis=-1)
+    return T
+
+def make_z_weights(thicknesses):
+    """Returns the CLPT integration weights of every ply as an array of shape
+    (3, laminates, plies).
+
+    The three rows are (zUp-zLow), (zUp^2-zLow^2)/2 and (zUp^3-zLow^3)/3,
+    with z measured from the mid-surface and negative towards the tool.
+    """
+    thk = np.atleast_2d(np.asarray(thicknesses, dtype=float))
+    zUp = np.cumsum(thk, axis=-1) - thk.sum(axis=-1, keepdims=True)/2
+    zLow = zUp - thk
+    return np.stack([zUp - zLow, (zUp**2 - zLow**2)/2, (zUp**3 - zLow**3)/3])
+
+def make_batch_stiffness(orientations, thicknesses, material_index, materials):
+    """Builds the ABD matrices and specific NT vectors of many laminates.
+
+    orientations, thicknesses and material_index are (laminates x plies)
+    arrays, listed from the tool side. Laminates with fewer plies are padded
+    with zero thickness plies. materials is either a list of Plate2D objects
+    or a table from make_material_table.
+
+    Returns a tuple of the stacked (N,6,6) ABD arrays and (N,3) specific NT
+    vectors, equal to ThinPlates.ABD and ThinPlates.specificNT to round-off.
+    """
+    if not isinstance(materials, dict):
+        materials = make_material_table(materials)
+    orientations = np.atleast_2d(orientations)
+    material_index = np.broadcast_to(material_index, orientations.shape)
+    thicknesses = np.broadcast_to(thicknesses, orientations.shape)
+
+    Q, cte = make_ply_stiffness(orientations, material_index, materials)
+    h = make_z_weights(thicknesses)
+
+    ABD = np.empty((orientations.shape[0],6,6))
+    ABD[:,0:3,0:3] = np.einsum('np,npij->nij', h[0], Q)
+    ABD[:,0:3,3:] = np.einsum('np,npij->nij', h[1], Q)
+    ABD[:,3:,0:3] = ABD[:,0:3,3:]
+    ABD[:,3:,3:] = np.einsum('np,npij->nij', h[2], Q)
+    specificNT = np.einsum('np,npij,npj->ni', h[0], Q, cte)
+    return ABD, specificNT
+
+def make_substack_stiffness(Q, QCTE, thicknesses, keep):
+    """Builds the ABD matrices and specific NT vectors of many sub-stacks of
+    each of N parent laminates.
+
+    Q is the (N, plies, 3, 3) ply Q-bar, QCTE the (N, plies, 3) Q-bar times
+    CTE and thicknesses the (N, plies) ply thicknesses of the parents. keep
+    is an (N, S, plies) boolean array marking the plies of S sub-stacks of
+    each parent. Dropped plies get zero thickness, so the cumulative sums of
+    make_z_weights re-centre every sub-stack on its own mid-plane, while
+    the Q-bar terms are shared and never rebuilt.
+
+    Returns the (N, S, 6, 6) ABD and (N, S, 3) specific NT arrays.
+    """
+    Q = np.asarray(Q, dtype=float)
+    nLam, nPly = Q.shape[:2]
+    thk = np.where(keep, np.asarray(thicknesses, dtype=float)[:,None,:], 0.0)
+    h = make_z_weights(thk)
+    Qflat = Q.reshape(nLam, nPly, 9)
+
+    ABD = np.empty(thk.shape[:2] + (6,6))
+    ABD[...,0:3,0:3] = np.matmul(h[0], Qflat).reshape(thk.shape[:2] + (3,3))
+    ABD[...,0:3,3:] = np.matmul(h[1], Qflat).reshape(thk.shape[:2] + (3,3))
+    ABD[...,3:,0:3] = ABD[...,0:3,3:]
+    ABD[...,3:,3:] = np.matmul(h[2], Qflat).reshape(thk.shape[:2] + (3,3))
+    specificNT = np.matmul(h[0], np.asarray(QCTE, dtype=float))
+    return ABD, specificNT
+
+def make_effective_properties(ABD, thicknesses, specificNT=None):
+    """Returns the ThinPlates.make_effective_properties dictionary for a
+    stack of (N,6,6) ABD matrices, with one array of N values per entry.
+
+    thicknesses are the N total laminate thicknesses. The CTE entries are
+    only included when the (N,3) specific NT vectors are given.
+    """
+    ABD = np.asarray(ABD, dtype=float).reshape(-1,6,6)
+    thk = np.asarray(thicknesses, dtype=float).reshape(-1)
+    compliance = np.linalg.inv(ABD)[:,0:3,0:3]
+    properties = {'Exx':1 / (compliance[:,0,0] * thk),
+                  'Eyy':1 / (compliance[:,1,1] * thk),
+                  'Gxy':1 / (compliance[:,2,2] * thk),
+                  'Nuxy':-compliance[:,0,1] / compliance[:,0,0],
+                  'Etaxs':compliance[:,0,2] / compliance[:,0,0],
+                  'Etays':compliance[:,1,2] / compliance[:,1,1]}
+    if specificNT is not None:
+        CTE = np.einsum('nij,nj->ni', compliance,
+                        np.asarray(specificNT, dtype=float).reshape(-1,3))
+        properties['ax'] = CTE[:,0]
+        properties['ay'] = CTE[:,1]
+        properties['axy'] = CTE[:,2]
+    return properties
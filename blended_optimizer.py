@@ -0,0 +1,203 @@
+"""Guide based blending of many panels that share continuous plies.
+
+Adjacent panels of a part carry different loads but must be laid up from
+the same continuous plies. Every panel here is a sub-stack of one symmetric
+guide laminate: the guide plies are dropped in a fixed order, and a panel
+with n half plies keeps the n plies dropped last. Any ply of a thin panel
+therefore runs on through every thicker panel, so ply continuity holds by
+construction.
+
+A candidate is the guide half stack (angle codes, see discrete_angles)
+together with one drop key per guide ply, the smallest key being dropped
+first. The H nested sub-stacks of a guide are built in one batch with
+batch_plates.make_substack_stiffness and checked against the loads of
+every panel. Each panel then takes the thinnest sub-stack that carries its
+loads, so only the guide and the drop order evolve. Populations can be
+split over a process pool with laminate_optimizer.PopulationEvaluator.
+"""
+import numpy as np
+import batch_plates as bp
+import failure_criteria as fc
+import laminate_optimizer as lo
+import stacking_ga as sg
+
+def make_nested_keep(keys):
+    """Returns the (N, H, H) boolean plies kept by the nested sub-stacks of
+    N guides with H half plies, given their (N, H) drop keys. Sub-stack n
+    holds the n+1 plies with the largest keys.
+    """
+    keys = np.atleast_2d(keys)
+    nHalf = keys.shape[1]
+    rank = np.argsort(np.argsort(keys, axis=1, kind='stable'), axis=1)
+    return rank[:,None,:] >= nHalf - 1 - np.arange(nHalf)[None,:,None]
+
+def make_nested_reserve(x, angles, loads, criterion='hoffman',
+                        material_index=0, size=2000000):
+    """Returns the (S, H, panels) first ply failure reserve factors of the
+    nested sub-stacks of S guides under the loads of every panel.
+
+    x is the (2H, S) array of guide half codes over drop keys, so that it
+    can be handed to PopulationEvaluator. loads holds one column of
+    resultants per panel. Laminates are checked in blocks of about size
+    ply and load case pairs to bound memory.
+    """
+    nHalf = x.shape[0] // 2
+    codes = np.asarray(x[:nHalf].T, dtype=np.uint8)
+    keep = make_nested_keep(x[nHalf:].T)
+    codes = np.concatenate((codes, codes[:,::-1]), axis=1)
+    keep = np.concatenate((keep, keep[...,::-1]), axis=2)
+    loads = np.asarray(loads, dtype=float).reshape(6,-1)
+
+    matl = np.broadcast_to(np.asarray(material_index, dtype=np.intp),
+                           codes.shape)
+    thicknesses = angles.make_thicknesses(codes, matl)
+    ABD, _ = bp.make_substack_stiffness(angles.QBar[matl, codes],
+             angles.QBarCTE[matl, codes], thicknesses, keep)
+
+    # One laminate per (guide, sub-stack) pair
+    nLam = codes.shape[0] * nHalf
+    orientations = np.repeat(np.nan_to_num(angles.decode(codes)), nHalf,
+                             axis=0)
+    thicknesses = np.where(keep, thicknesses[:,None,:], 0.0).reshape(nLam,-1)
+    matl = np.repeat(matl, nHalf, axis=0)
+    ABD = ABD.reshape(nLam,6,6)
+    reserve = np.empty((nLam, loads.shape[1]))
+    block = max(1, int(size) // (loads.shape[1] * codes.shape[1]))
+    for start in range(0, nLam, block):
+        part = slice(start, start + block)
+        reserve[part] = fc.make_batch_reserve(orientations[part],
+                        thicknesses[part], matl[part], angles.Materials,
+                        loads, criterion, ABD[part])['ReserveFactor']
+    return reserve.reshape(codes.shape[0], nHalf, -1)
+
+class BlendedStackingGA(sg.StackingSequenceGA):
+    """Genetic algorithm for a blended multi-panel laminate.
+
+    loads is a (6, panels) block of resultants, one column per panel, and
+    areas the panel areas (all ones by default) that weight the total mass.
+    max_plies is the largest full (symmetric) ply count of the guide.
+    workers spreads each generation over a process pool as in
+    laminate_optimizer.make_simple_optimum. Other arguments are as for
+    StackingSequenceGA.
+    """
+
+    def __init__(self, material, loads, areas=None, angles=(0, 45, -45, 90),
+                 max_plies=32, criterion='hoffman', population=200,
+                 elite=0.02, crossover=0.8, mutation=0.1, seed=None,
+                 workers=1):
+        sg.StackingSequenceGA.__init__(self, material, loads, angles,
+            max_plies, criterion, population, elite, crossover, mutation,
+            seed)
+        self.Panels = self.Loads.shape[1]
+        self.Areas = np.ones(self.Panels) if areas is None else \
+                     np.asarray(areas, dtype=float).ravel()
+        assert self.Areas.shape == (self.Panels,), \
+            'Need one area per panel load column'
+        self.Workers = workers
+        # Weight of every panel at the full guide, used to scale the penalty
+        self.Penalty = self.Penalty * self.Areas.sum()
+
+    def make_panel_plies(self, reserve):
+        """Picks the thinnest feasible sub-stack of every panel from an
+        (N, H, panels) array of nested reserve factors.
+
+        Returns the (N, panels) half ply counts and governing reserve
+        factors. A panel that no sub-stack can carry takes the full guide.
+        """
+        feasible = reserve >= 1
+        index = np.where(feasible.any(axis=1), np.argmax(feasible, axis=1),
+                         self.HalfPlies - 1)
+        return index + 1, np.take_along_axis(reserve, index[:,None,:],
+                                             axis=1)[:,0,:]
+
+    def make_fitness(self, half, keys, evaluate=None):
+        """Scores a population of guide half stacks and drop keys in one
+        batch. evaluate maps the stacked (2H, N) genes to nested reserve
+        factors, make_nested_reserve in this process by default.
+
+        Returns the fitness (lower is better), total weight, panel half ply
+        counts and panel reserve factors.
+        """
+        x = np.vstack((half.T, keys.T))
+        if evaluate is None:
+            reserve = make_nested_reserve(x, self.Angles, self.Loads,
+                                          self.Criterion)
+        else:
+            reserve = evaluate(x)
+        plies, panelReserve = self.make_panel_plies(reserve)
+        weight = 2 * plies.dot(self.Areas) * self.PlyWeight
+        shortfall = np.maximum(1 - panelReserve, 0).dot(self.Areas)
+        fitness = weight + self.Penalty * shortfall / self.Areas.sum()
+        return fitness, weight, plies, panelReserve
+
+    def make_initial_population(self):
+        """Returns random full guide half codes and drop keys."""
+        shape = (self.PopulationSize, self.HalfPlies)
+        codes = self.Random.integers(0, self.Angles.PadCode, shape)
+        return codes.astype(np.uint8), self.Random.random(shape)
+
+    def make_offspring(self, half, keys, fitness):
+        """Breeds the next generation with the StackingSequenceGA operators.
+        Crossover carries each ply's drop key along with it, swaps leave
+        the keys in place, and a drop order mutation redraws one key.
+        """
+        nPop, nHalf = half.shape
+        nChild = nPop - self.Elite
+
+        parents = self.make_parents(fitness, nChild)
+        fromFather = self.make_crossover(nChild, nHalf)
+        child = np.where(fromFather, half[parents[1]], half[parents[0]])
+        childKeys = np.where(fromFather, keys[parents[1]], keys[parents[0]])
+        self.mutate_angles(child)
+        self.mutate_swaps(child)
+
+        # Move a random ply elsewhere in the drop order
+        rows = np.arange(nChild)
+        pick = self.Random.random(nChild) < self.Mutation
+        pos = self.Random.integers(0, nHalf, nChild)
+        childKeys[rows[pick], pos[pick]] = self.Random.random(pick.sum())
+
+        elite = np.argsort(fitness)[:self.Elite]
+        return np.concatenate((half[elite], child)).astype(np.uint8), \
+               np.concatenate((keys[elite], childKeys))
+
+    def run(self, generations=100, verbose=False):
+        """Evolves the population and returns a dictionary of the best
+        blended design found.
+
+        Guide holds the guide half stack codes and DropOrder the guide ply
+        indices in the order they are dropped. Per panel, PanelPlies is the
+        full ply count, PanelCodes the full stack with dropped plies as pad
+        codes, and ReserveFactor the governing reserve factor. Weight is
+        the area weighted total and History the best fitness of every
+        generation.
+        """
+        args = (self.Angles, self.Loads, self.Criterion)
+        with lo.PopulationEvaluator(make_nested_reserve, args,
+                                    self.Workers) as evaluate:
+            half, keys = self.make_initial_population()
+            fitness, weight, plies, reserve = self.make_fitness(half, keys,
+                                                                evaluate)
+            history = list()
+            for gen in range(int(generations)):
+                half, keys = self.make_offspring(half, keys, fitness)
+                fitness, weight, plies, reserve = self.make_fitness(half,
+                                                  keys, evaluate)
+                best = np.argmin(fitness)
+                history.append(fitness[best])
+                if verbose:
+                    self.print_generation(gen, weight[best],
+                                          reserve[best].min())
+
+        best = np.argmin(fitness)
+        keep = make_nested_keep(keys[best])[0][plies[best] - 1]
+        panelCodes = np.where(keep, half[best], self.Angles.PadCode)
+        return {'Guide':half[best],
+                'DropOrder':np.argsort(keys[best], kind='stable'),
+                'PanelPlies':2 * plies[best],
+                'PanelCodes':np.concatenate((panelCodes,
+                                             panelCodes[:,::-1]), axis=1),
+                'Weight':weight[best],
+                'ReserveFactor':reserve[best],
+                'Feasible':bool(np.all(reserve[best] >= 1)),
+                'History':np.array(history)}
@@ -0,0 +1,58 @@
+"""Chunk by chunk evaluation of large batches into memory or onto disk.
+
+A batch of S items (grid points, mesh elements, ...) is described by a
+make_chunk(start, stop) callable that returns a dictionary of output arrays
+with one leading axis over items start to stop. The helpers here run it
+over the whole batch, either into arrays in memory or into one .npy file
+per output, so that memory use is set by the chunk size and not by S.
+"""
+import os
+import numpy as np
+import numpy.lib.format as npformat
+
+def evaluate_chunks(make_chunk, size, chunk=100000, shape=None):
+    """Evaluates items 0 to size in memory, chunk items at a time.
+
+    Returns a dictionary of output arrays whose leading axis over the items
+    is reshaped to shape, (size,) by default.
+    """
+    shape = (int(size),) if shape is None else tuple(shape)
+    results = dict()
+    for start in range(0, size, int(chunk)):
+        part = make_chunk(start, min(start + int(chunk), size))
+        for name, values in part.items():
+            if name not in results:
+                results[name] = np.empty((size,) + values.shape[1:],
+                                         dtype=values.dtype)
+            results[name][start:start+values.shape[0]] = values
+    for name in list(results):
+        results[name] = results[name].reshape(shape + results[name].shape[1:])
+    return results
+
+def stream_chunks(make_chunk, size, directory, chunk=100000, outputs=None,
+                  shape=None):
+    """Evaluates items 0 to size chunk by chunk into one .npy file per output
+    in directory.
+
+    outputs limits the files written (all by default) and shape is the
+    leading shape of every file, (size,) by default. Returns a dictionary
+    of read-only memory maps of the files.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    shape = (int(size),) if shape is None else tuple(shape)
+    files = dict()
+    for start in range(0, size, int(chunk)):
+        part = make_chunk(start, min(start + int(chunk), size))
+        for name in (part if outputs is None else outputs):
+            values = part[name]
+            if name not in files:
+                files[name] = npformat.open_memmap(
+                    os.path.join(directory, name + '.npy'), mode='w+',
+                    dtype=values.dtype, shape=shape + values.shape[1:])
+            flat = files[name].reshape((size,) + values.shape[1:])
+            flat[start:start+values.shape[0]] = values
+    for mapped in files.values():
+        mapped.flush()
+    return dict((name, np.load(os.path.join(directory, name + '.npy'),
+                               mmap_mode='r')) for name in files)
@@ -0,0 +1,117 @@
+"""Vectorized sweeps of parameterized laminates over design grids.
+
+A template is any callable taking one keyword array per design parameter,
+all of the same length S, and returning the padded (S x plies)
+orientations, thicknesses and material_index arrays of batch_plates.
+layup_templates.LayupTemplate objects, such as make_amn_template, are the
+usual templates. The sweep takes the Cartesian product of the parameter
+grids and evaluates it in flat chunks with the batched kernels. Each chunk
+is independent, so a grid larger than memory can be streamed straight to
+.npy files on disk.
+
+Results are labelled: every output array has the grid dimensions first,
+named in Dims with their values in Coords, followed by any trailing axes
+listed in Axes.
+"""
+import os
+import numpy as np
+import batch_plates as bp
+import chunked_output as co
+import failure_criteria as fc
+
+EFFECTIVE = ('Exx', 'Eyy', 'Gxy', 'Nuxy', 'Etaxs', 'Etays',
+             'ax', 'ay', 'axy')
+
+class DesignSweep(object):
+    """Evaluates a laminate template over the product of parameter grids.
+
+    grids is a list of (name, values) pairs, or a dictionary, giving the
+    sweep dimensions in order. materials defaults to the Materials of the
+    template, when it has them. loads is a 6 vector or a (6,M) block of
+    resultants used for the Strains and ReserveFactor outputs.
+    """
+
+    def __init__(self, template, grids, materials=None, loads=None,
+                 criterion='hoffman'):
+        grids = list(grids.items()) if isinstance(grids, dict) else grids
+        self.Template = template
+        self.Dims = tuple(name for name, _ in grids)
+        self.Coords = dict((name, np.asarray(values).ravel()) \
+                           for name, values in grids)
+        self.Shape = tuple(self.Coords[name].size for name in self.Dims)
+        self.Size = int(np.prod(self.Shape))
+        if materials is None:
+            materials = template.Materials
+        self.Materials = list(materials)
+        self.MaterialTable = bp.make_material_table(self.Materials)
+        self.Loads = None if loads is None else \
+                     np.asarray(loads, dtype=float).reshape(6,-1)
+        self.Criterion = criterion
+
+        # Trailing axes of every output
+        self.Axes = dict((name, ()) for name in EFFECTIVE + ('Weight',))
+        self.Axes['ABD'] = ('row', 'column')
+        if self.Loads is not None:
+            self.Axes['Strains'] = ('case', 'component')
+            self.Axes['ReserveFactor'] = ('case',)
+
+    def make_parameters(self, start, stop):
+        """Returns the parameter arrays of flat grid points start to stop."""
+        index = np.unravel_index(np.arange(start, stop), self.Shape)
+        return dict((name, self.Coords[name][idx]) \
+                    for name, idx in zip(self.Dims, index))
+
+    def make_chunk(self, start, stop):
+        """Evaluates flat grid points start to stop. Returns a dictionary of
+        output arrays with one leading axis over the points.
+        """
+        orientations, thicknesses, material_index = \
+            self.Template(**self.make_parameters(start, stop))
+        orientations = np.atleast_2d(orientations)
+        thicknesses = np.broadcast_to(thicknesses, orientations.shape)
+        material_index = np.broadcast_to(np.asarray(material_index,
+                                         dtype=np.intp), orientations.shape)
+        ABD, NT = bp.make_batch_stiffness(orientations, thicknesses,
+                                          material_index, self.MaterialTable)
+
+        results = bp.make_effective_properties(ABD, thicknesses.sum(axis=1),
+                                               NT)
+        results['ABD'] = ABD
+        results['Weight'] = np.einsum('np,np->n', thicknesses,
+                            self.MaterialTable['Density'][material_index])
+        if self.Loads is not None:
+            results['Strains'] = np.linalg.solve(ABD, np.broadcast_to(
+                                 self.Loads, (ABD.shape[0],)+self.Loads.shape)
+                                 ).transpose(0,2,1)
+            results['ReserveFactor'] = fc.make_batch_reserve(orientations,
+                thicknesses, material_index, self.Materials, self.Loads,
+                self.Criterion, ABD)['ReserveFactor']
+        return results
+
+    def _make_labels(self, results):
+        results['Dims'] = self.Dims
+        results['Coords'] = self.Coords
+        results['Axes'] = self.Axes
+        return results
+
+    def evaluate(self, chunk=100000):
+        """Evaluates the whole grid in memory, chunk points at a time, and
+        returns the labelled result dictionary.
+        """
+        results = co.evaluate_chunks(self.make_chunk, self.Size, chunk,
+                                     self.Shape)
+        return self._make_labels(results)
+
+    def stream(self, directory, chunk=100000, outputs=None):
+        """Evaluates the grid chunk by chunk into one .npy file per output
+        in directory, so memory use is set by chunk and not by the grid.
+
+        outputs limits the files written (all by default). The grid
+        coordinates are saved in coords.npz. Returns the labelled result
+        dictionary holding read-only memory maps of the files.
+        """
+        outputs = tuple(self.Axes) if outputs is None else tuple(outputs)
+        results = co.stream_chunks(self.make_chunk, self.Size, directory,
+                                   chunk, outputs, self.Shape)
+        np.savez(os.path.join(directory, 'coords.npz'), **self.Coords)
+        return self._make_labels(results)
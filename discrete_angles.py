@@ -0,0 +1,140 @@
+"""Integer coded laminates built from a small set of allowed ply angles.
+
+Production laminates only ever use a handful of angles, so the global ply
+stiffness (Q-bar) and transformed CTE of every angle and material pair can be
+computed once and stored in a table. Laminates are then small integer arrays
+of angle codes, and building their ABD matrices is nothing but table gathers
+and sums with no trig at all.
+
+One extra code, DiscreteAngles.PadCode, marks an empty ply position. Its
+table entries and thickness are zero, so ragged batches can be padded with
+it freely.
+"""
+import numpy as np
+import batch_plates as bp
+
+class DiscreteAngles(object):
+    """Lookup tables of Q-bar and Q-bar times CTE for an angle alphabet.
+
+    angles is the list of allowed orientations in degrees and materials a
+    list of Plate2D materials. Codes index the angle list in order. Ply
+    thickness defaults to the Thickness of each material.
+    """
+
+    def __init__(self, angles, materials):
+        self.Angles = np.array(angles, dtype=float).ravel()
+        self.Materials = list(materials)
+        self.PadCode = len(self.Angles)
+        assert self.PadCode < 255, 'Too many angles for 8 bit codes'
+
+        nMatl = len(self.Materials)
+        table = bp.make_material_table(self.Materials)
+        grid = np.broadcast_to(self.Angles, (nMatl, self.PadCode))
+        index = np.broadcast_to(np.arange(nMatl)[:,None], grid.shape)
+        Q, cte = bp.make_ply_stiffness(grid, index, table)
+
+        # Last column in each table is the zero padding ply
+        self.QBar = np.zeros((nMatl, self.PadCode+1, 3, 3))
+        self.QBar[:,:-1] = Q
+        self.CTE = np.zeros((nMatl, self.PadCode+1, 3))
+        self.CTE[:,:-1] = cte
+        self.QBarCTE = np.einsum('maij,maj->mai', self.QBar, self.CTE)
+        self.PlyThickness = np.array([float(matl.Thickness) \
+                                      for matl in self.Materials])
+
+        # Two codes fit in a byte for the common small alphabets
+        self.CodesPerByte = 2 if self.PadCode < 16 else 1
+        if self.CodesPerByte == 2:
+            self.PadByte = bytes([(self.PadCode << 4) | self.PadCode])
+        else:
+            self.PadByte = bytes([self.PadCode])
+
+    def encode(self, orientations):
+        """Returns the uint8 angle codes of an array of orientations.
+
+        Angles are matched modulo 180 degrees. Anything not in the alphabet
+        raises a ValueError. NaN orientations are encoded as padding.
+        """
+        orient = np.asarray(orientations, dtype=float)
+        reduced = (orient + 90) % 180 - 90
+        alphabet = (self.Angles + 90) % 180 - 90
+        match = np.isclose(reduced[...,None], alphabet, rtol=0, atol=1e-9)
+        pad = np.isnan(orient)
+        if not np.all(match.any(axis=-1) | pad):
+            raise ValueError('Orientation not in the discrete angle set')
+        codes = np.argmax(match, axis=-1).astype(np.uint8)
+        codes[pad] = self.PadCode
+        return codes
+
+    def decode(self, codes):
+        """Returns the orientations of an array of codes, NaN for padding."""
+        angles = np.append(self.Angles, np.nan)
+        return angles[np.asarray(codes, dtype=np.intp)]
+
+    def make_thicknesses(self, codes, material_index=0):
+        """Returns the ply thickness of every code, zero for padding."""
+        codes = np.asarray(codes)
+        thk = np.broadcast_to(self.PlyThickness[material_index], codes.shape)
+        return np.where(codes == self.PadCode, 0.0, thk)
+
+    def make_batch_stiffness(self, codes, material_index=0, thicknesses=None):
+        """Builds the (N,6,6) ABD and (N,3) specific NT of a batch of coded
+        laminates given as a (laminates x plies) code array.
+
+        Results match batch_plates.make_batch_stiffness for the decoded
+        orientations.
+        """
+        codes = np.atleast_2d(np.asarray(codes, dtype=np.intp))
+        matl = np.broadcast_to(np.asarray(material_index, dtype=np.intp),
+                               codes.shape)
+        if thicknesses is None:
+            thicknesses = self.make_thicknesses(codes, matl)
+        thicknesses = np.where(codes == self.PadCode, 0.0,
+                               np.broadcast_to(thicknesses, codes.shape))
+        h = bp.make_z_weights(thicknesses)
+        Q = self.QBar[matl, codes]
+
+        ABD = np.empty((codes.shape[0],6,6))
+        ABD[:,0:3,0:3] = np.einsum('np,npij->nij', h[0], Q)
+        ABD[:,0:3,3:] = np.einsum('np,npij->nij', h[1], Q)
+        ABD[:,3:,0:3] = ABD[:,0:3,3:]
+        ABD[:,3:,3:] = np.einsum('np,npij->nij', h[2], Q)
+        specificNT = np.einsum('np,npi->ni', h[0], self.QBarCTE[matl, codes])
+        return ABD, specificNT
+
+    def make_keys(self, codes):
+        """Packs coded laminates into bytes, usable as dictionary keys.
+
+        A 1D code array gives a single key and a 2D array a list of keys, one
+        per row. Trailing padding does not change the key. Only the angles
+        are packed, so keys of laminates with mixed materials need the
+        material index added by the caller.
+        """
+        codes = np.asarray(codes, dtype=np.uint8)
+        single = codes.ndim == 1
+        codes = np.atleast_2d(codes)
+        if self.CodesPerByte == 2:
+            if codes.shape[1] % 2:
+                pad = np.full((codes.shape[0],1), self.PadCode, dtype=np.uint8)
+                codes = np.hstack((codes, pad))
+            codes = (codes[:,0::2] << 4) | codes[:,1::2]
+        keys = [row.tobytes().rstrip(self.PadByte) for row in codes]
+        return keys[0] if single else keys
+
+    def make_codes(self, key, n_plies=None):
+        """Unpacks a key from make_keys back into a code array, padded out to
+        n_plies if given.
+        """
+        packed = np.frombuffer(key, dtype=np.uint8)
+        if self.CodesPerByte == 2:
+            codes = np.empty(2*packed.shape[0], dtype=np.uint8)
+            codes[0::2] = packed >> 4
+            codes[1::2] = packed & 15
+        else:
+            codes = packed.copy()
+        real = np.flatnonzero(codes != self.PadCode)
+        codes = codes[:real[-1]+1] if real.size else codes[:0]
+        if n_plies is not None:
+            codes = np.append(codes, np.full(n_plies - codes.shape[0],
+                              self.PadCode, dtype=np.uint8))
+        return codes
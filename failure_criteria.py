@@ -0,0 +1,308 @@
+"""Vectorized first ply failure criteria for thin plate laminates.
+
+Every criterion works on whole (load cases x plies x 3) arrays of fibre
+coordinate stress and strain, as returned by
+ThinPlates.make_ply_stress_strain_cases, together with per-ply allowables.
+An index of 1 or more means the ply has failed.
+
+Strengths and strain limits are treated as magnitudes, so compressive
+allowables may be given with either sign. Shear strains are engineering
+strains. Failure modes are reported as integer codes indexing MODES.
+"""
+import numpy as np
+import batch_plates as bp
+
+CRITERIA = ('maxstress', 'maxstrain', 'tsaihill', 'hoffman', 'tsaiwu')
+MODES = ('fiber tension', 'fiber compression', 'matrix tension',
+         'matrix compression', 'shear')
+
+def make_allowables(materials, material_index):
+    """Returns a dictionary of per-ply allowable arrays.
+
+    Keys match the Plate2D attribute names (F1t, Ep1t, ...) and each value
+    is an array with the shape of material_index.
+    """
+    names = ['F1t', 'F1c', 'F2t', 'F2c', 'F12s',
+             'Ep1t', 'Ep1c', 'Ep2t', 'Ep2c', 'Ep12s']
+    table = np.abs(np.array([[float(getattr(matl, name)) for name in names] \
+                             for matl in materials])).reshape(-1, len(names))
+    idx = np.asarray(material_index, dtype=np.intp)
+    return dict((name, table[idx, col]) for col, name in enumerate(names))
+
+def _directional_ratios(values, tension1, compression1, tension2,
+                        compression2, shear):
+    """Returns the (..., 5) array of value to allowable ratios, in MODES
+    order. Only the ratio matching the sign of each component is non-zero.
+    """
+    v1 = values[...,0]
+    v2 = values[...,1]
+    ratios = np.empty(values.shape[:-1] + (5,))
+    ratios[...,0] = np.maximum(v1, 0) / tension1
+    ratios[...,1] = np.maximum(-v1, 0) / compression1
+    ratios[...,2] = np.maximum(v2, 0) / tension2
+    ratios[...,3] = np.maximum(-v2, 0) / compression2
+    ratios[...,4] = np.abs(values[...,2]) / shear
+    return ratios
+
+def make_failure_indices(stress, strain, allowables, criterion='hoffman'):
+    """Evaluates a failure criterion for every ply and load case.
+
+    stress and strain are (..., plies, 3) arrays and allowables comes from
+    make_allowables. Returns the failure index and failure mode code arrays,
+    both shaped like stress without its last axis. The mode of the
+    interactive criteria is the largest of their individual stress ratios.
+    """
+    if criterion not in CRITERIA:
+        raise KeyError('Unknown failure criterion '+str(criterion))
+    al = allowables
+    if criterion == 'maxstrain':
+        ratios = _directional_ratios(np.asarray(strain, dtype=float),
+                                     al['Ep1t'], al['Ep1c'], al['Ep2t'],
+                                     al['Ep2c'], al['Ep12s'])
+        return ratios.max(axis=-1), ratios.argmax(axis=-1)
+
+    stress = np.asarray(stress, dtype=float)
+    ratios = _directional_ratios(stress, al['F1t'], al['F1c'], al['F2t'],
+                                 al['F2c'], al['F12s'])
+    mode = ratios.argmax(axis=-1)
+    if criterion == 'maxstress':
+        return ratios.max(axis=-1), mode
+
+    s1 = stress[...,0]
+    s2 = stress[...,1]
+    s12 = stress[...,2]
+    if criterion == 'tsaihill':
+        f1 = np.where(s1 >= 0, al['F1t'], al['F1c'])
+        f2 = np.where(s2 >= 0, al['F2t'], al['F2c'])
+        index = (s1/f1)**2 - s1*s2/f1**2 + (s2/f2)**2 + (s12/al['F12s'])**2
+        return index, mode
+
+    quadratic, linear = _make_quadratic_parts(stress, allowables, criterion)
+    return quadratic + linear, mode
+
+def _make_strength_tensors(allowables, criterion):
+    """Returns the (F1, F2, F11, F22, F66, F12) strength tensor terms of the
+    Hoffman or Tsai-Wu criterion.
+    """
+    al = allowables
+    F1 = 1/al['F1t'] - 1/al['F1c']
+    F2 = 1/al['F2t'] - 1/al['F2c']
+    F11 = 1/(al['F1t']*al['F1c'])
+    F22 = 1/(al['F2t']*al['F2c'])
+    F66 = 1/al['F12s']**2
+    if criterion == 'hoffman':
+        F12 = -F11/2
+    else:
+        # Tsai-Wu with the usual interaction term estimate
+        F12 = -np.sqrt(F11*F22)/2
+    return F1, F2, F11, F22, F66, F12
+
+def _make_quadratic_parts(stress, allowables, criterion):
+    """Returns the quadratic and linear parts of the Hoffman or Tsai-Wu
+    index of (..., 3) stresses.
+    """
+    F1, F2, F11, F22, F66, F12 = _make_strength_tensors(allowables, criterion)
+    s1 = stress[...,0]
+    s2 = stress[...,1]
+    s12 = stress[...,2]
+    quadratic = F11*s1**2 + F22*s2**2 + F66*s12**2 + 2*F12*s1*s2
+    return quadratic, F1*s1 + F2*s2
+
+def make_governing(index, mode):
+    """Reduces (load cases x plies) index and mode arrays to the governing
+    ply of each load case.
+
+    Returns a dictionary holding the governing Index, Ply and Mode arrays,
+    each of shape (load cases,).
+    """
+    index = np.atleast_2d(index)
+    ply = np.argmax(index, axis=-1)
+    cases = np.arange(index.shape[0])
+    return {'Index':index[cases, ply],
+            'Ply':ply,
+            'Mode':np.atleast_2d(mode)[cases, ply]}
+
+def evaluate_failure(stress, strain, allowables, criterion='hoffman'):
+    """Evaluates a criterion over (load cases x plies x 3) arrays and returns
+    the make_governing dictionary, plus the full PlyIndex and PlyMode arrays.
+    """
+    index, mode = make_failure_indices(stress, strain, allowables, criterion)
+    result = make_governing(index, mode)
+    result['PlyIndex'] = index
+    result['PlyMode'] = mode
+    return result
+
+def _smallest_root(a, b):
+    """Returns the smallest positive l solving a*l**2 + b*l = 1, or infinity
+    if there is none. Uses the root form that is stable for a -> 0.
+    """
+    disc = b**2 + 4*a
+    denom = b + np.sqrt(np.maximum(disc, 0))
+    with np.errstate(divide='ignore'):
+        return np.where((disc >= 0) & (denom > 0), 2/denom, np.inf)
+
+def make_ply_reserve(stress, strain, allowables, criterion='hoffman'):
+    """Returns the load factor at which each ply fails, for ply stresses and
+    strains that scale linearly with the applied load.
+
+    stress and strain are (..., plies, 3) arrays for a unit load. Returns the
+    reserve factor and failure mode code arrays, shaped like stress without
+    its last axis.
+    """
+    if criterion in ('hoffman', 'tsaiwu'):
+        stress = np.asarray(stress, dtype=float)
+        al = allowables
+        mode = _directional_ratios(stress, al['F1t'], al['F1c'], al['F2t'],
+                                   al['F2c'], al['F12s']).argmax(axis=-1)
+        quadratic, linear = _make_quadratic_parts(stress, al, criterion)
+        return _smallest_root(quadratic, linear), mode
+
+    index, mode = make_failure_indices(stress, strain, allowables, criterion)
+    with np.errstate(divide='ignore'):
+        if criterion == 'tsaihill':
+            return np.where(index > 0, 1/np.sqrt(np.maximum(index, 0)),
+                            np.inf), mode
+        return np.where(index > 0, 1/index, np.inf), mode
+
+def make_load_forms(stress_map, allowables, criterion='hoffman',
+                    strain_map=None):
+    """Compiles a criterion into per-ply forms in resultant space.
+
+    stress_map is a (plies, 3, 6) array taking the 6 resultants to the
+    fibre coordinate stress of each ply (strain_map likewise for the strain,
+    needed for maxstrain). As the stresses are linear in the resultants,
+    Hoffman and Tsai-Wu become a quadratic plus a linear term in the
+    resultants, and Tsai-Hill a quadratic that depends on the signs of the
+    two normal stresses only.
+
+    Returns a dictionary of the compiled forms for make_reserve_factors.
+    """
+    if criterion not in CRITERIA:
+        raise KeyError('Unknown failure criterion '+str(criterion))
+    al = allowables
+    S = np.asarray(stress_map, dtype=float)
+
+    # Stress ratio rows, in MODES order with shear counted both ways. These
+    # give the failure mode of every criterion except maxstrain, which
+    # uses its strain ratio rows.
+    ratio = np.stack([S[:,0]/al['F1t'][:,None], -S[:,0]/al['F1c'][:,None],
+                      S[:,1]/al['F2t'][:,None], -S[:,1]/al['F2c'][:,None],
+                      S[:,2]/al['F12s'][:,None], -S[:,2]/al['F12s'][:,None]],
+                     axis=1)
+    forms = {'Criterion':criterion, 'Ratio':ratio}
+
+    if criterion == 'maxstrain':
+        E = np.asarray(strain_map, dtype=float)
+        forms['Linear'] = np.stack([E[:,0]/al['Ep1t'][:,None],
+                          -E[:,0]/al['Ep1c'][:,None],
+                          E[:,1]/al['Ep2t'][:,None], -E[:,1]/al['Ep2c'][:,None],
+                          E[:,2]/al['Ep12s'][:,None],
+                          -E[:,2]/al['Ep12s'][:,None]], axis=1)
+        forms['Ratio'] = forms['Linear']
+    elif criterion == 'maxstress':
+        forms['Linear'] = ratio
+    elif criterion == 'tsaihill':
+        # One quadratic for each (s1 < 0, s2 < 0) sign combination
+        H = np.zeros((S.shape[0],4,3,3))
+        for combo in range(4):
+            f1 = al['F1c'] if combo // 2 else al['F1t']
+            f2 = al['F2c'] if combo % 2 else al['F2t']
+            H[:,combo,0,0] = 1/f1**2
+            H[:,combo,0,1] = H[:,combo,1,0] = -1/(2*f1**2)
+            H[:,combo,1,1] = 1/f2**2
+            H[:,combo,2,2] = 1/al['F12s']**2
+        forms['Sign'] = S[:,0:2]
+        forms['Quadratic'] = np.einsum('pia,pcij,pjb->pcab', S, H, S)
+    else:
+        F1, F2, F11, F22, F66, F12 = _make_strength_tensors(al, criterion)
+        H = np.zeros((S.shape[0],3,3))
+        H[:,0,0] = F11
+        H[:,1,1] = F22
+        H[:,0,1] = H[:,1,0] = F12
+        H[:,2,2] = F66
+        F = np.stack([F1, F2, np.zeros_like(F1)], axis=-1)
+        forms['Quadratic'] = np.einsum('pia,pij,pjb->pab', S, H, S)
+        forms['Linear'] = np.einsum('pi,pia->pa', F, S)
+    return forms
+
+def make_reserve_factors(forms, resultants):
+    """Returns the exact failure load factor of every ply for each load case.
+
+    resultants is a (6,M) block, one load case per column. For each case and
+    ply the factor l is the smallest positive root of index(l*R) = 1, or
+    infinity if the ply never fails along that load direction. Returns a
+    dictionary holding the governing ReserveFactor, Ply and Mode arrays of
+    shape (M,), plus the full (M, plies) PlyReserve array.
+    """
+    R = np.asarray(resultants, dtype=float).reshape(6,-1)
+    criterion = forms['Criterion']
+
+    if criterion in ('maxstress', 'maxstrain'):
+        with np.errstate(divide='ignore'):
+            index = np.einsum('pka,am->mpk', forms['Linear'], R).max(axis=-1)
+            reserve = np.where(index > 0, 1/index, np.inf)
+    elif criterion == 'tsaihill':
+        sign = np.einsum('pka,am->mpk', forms['Sign'], R) < 0
+        combo = 2*sign[...,0] + sign[...,1]
+        q = np.einsum('am,pcab,bm->mpc', R, forms['Quadratic'], R)
+        q = np.take_along_axis(q, combo[...,None], axis=-1)[...,0]
+        with np.errstate(divide='ignore'):
+            reserve = np.where(q > 0, 1/np.sqrt(np.maximum(q, 0)), np.inf)
+    else:
+        a = np.einsum('am,pab,bm->mp', R, forms['Quadratic'], R)
+        b = np.einsum('pa,am->mp', forms['Linear'], R)
+        reserve = _smallest_root(a, b)
+
+    ply = np.argmin(reserve, axis=-1)
+    cases = np.arange(R.shape[1])
+    rows = np.einsum('mka,am->mk', forms['Ratio'][ply], R)
+    return {'ReserveFactor':reserve[cases, ply],
+            'Ply':ply,
+            'Mode':np.array([0,1,2,3,4,4])[np.argmax(rows, axis=-1)],
+            'PlyReserve':reserve}
+
+def make_batch_reserve(orientations, thicknesses, material_index, materials,
+                       loads, criterion='hoffman', ABD=None):
+    """Returns the first ply failure load factors of a batch of laminates
+    under a set of load cases.
+
+    Laminates are padded (laminates x plies) arrays as in batch_plates and
+    loads a (6,M) block of resultants shared by all laminates. Plies are
+    checked at their mid-surface. ABD may be passed in when it is already
+    known, for instance from a DiscreteAngles table.
+
+    Returns a dictionary of the governing ReserveFactor, Ply and Mode, each
+    of shape (laminates, M).
+    """
+    orientations = np.atleast_2d(np.asarray(orientations, dtype=float))
+    thicknesses = np.broadcast_to(thicknesses, orientations.shape)
+    material_index = np.broadcast_to(np.asarray(material_index,
+                                     dtype=np.intp), orientations.shape)
+    if ABD is None:
+        ABD, _ = bp.make_batch_stiffness(orientations, thicknesses,
+                                         material_index, materials)
+    R = np.asarray(loads, dtype=float).reshape(6,-1)
+    eps = np.linalg.solve(ABD, np.broadcast_to(R, (ABD.shape[0],) + R.shape))
+
+    h = bp.make_z_weights(thicknesses)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        zMid = np.where(h[0] > 0, h[1]/h[0], 0)
+    # (laminates, M, plies, 3) global strains at each ply mid-surface
+    globalStrain = eps[:,None,0:3,:] + zMid[:,:,None,None]*eps[:,None,3:,:]
+    T = bp.make_strain_transforms(orientations)
+    strain = np.matmul(T, globalStrain).transpose(0,3,1,2)
+    stiffness = np.array([np.asarray(matl.make_stiffness()) \
+                          for matl in materials])
+    stress = np.matmul(stiffness[material_index][:,None],
+                       strain[...,None])[...,0]
+
+    allowables = make_allowables(materials, material_index[:,None,:])
+    reserve, mode = make_ply_reserve(stress, strain, allowables, criterion)
+    reserve[np.broadcast_to((thicknesses <= 0)[:,None,:], reserve.shape)] \
+        = np.inf
+
+    ply = np.argmin(reserve, axis=-1)
+    return {'ReserveFactor':np.take_along_axis(reserve, ply[...,None],
+                                               axis=-1)[...,0],
+            'Ply':ply,
+            'Mode':np.take_along_axis(mode, ply[...,None], axis=-1)[...,0]}
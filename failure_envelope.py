@@ -0,0 +1,89 @@
+"""First ply failure envelopes of thin plates under combined N and M loads.
+
+The laminate is loaded by a*N + b*M, where N is a vector of force resultants
+and M a vector of moment resultants. The envelope is the closed curve in
+the (a,b) plane where the first ply fails. Every direction from the origin
+crosses that curve once, at a distance given exactly by the reserve factor
+of ThinPlates.make_reserve_factors. All directions of a refinement pass are
+therefore solved together, and new directions are only added where the
+curve bends.
+"""
+import numpy as np
+
+def make_envelope_points(N, M, analysis, phi, criterion='hoffman',
+                         location='mid'):
+    """Returns the (a,b) envelope points along the directions phi (radians,
+    measured from the a axis). Directions that never fail give infinite
+    points.
+    """
+    R = np.zeros((6, len(phi)))
+    R[0:3] = np.outer(np.ravel(N), np.cos(phi))
+    R[3:] = np.outer(np.ravel(M), np.sin(phi))
+    reserve = analysis.make_reserve_factors(R, criterion,
+                                            location)['ReserveFactor']
+    with np.errstate(invalid='ignore'):
+        return reserve*np.round(np.cos(phi), 15), \
+               reserve*np.round(np.sin(phi), 15)
+
+def make_NM_envelope(N, M, analysis, criterion='hoffman', location='mid',
+                     n_start=32, tolerance=1e-3, max_level=12, verbose=False):
+    """Builds the N-M linear variation failure envelope of a ThinPlates
+    analysis.
+
+    Starts from n_start evenly spaced directions and keeps halving any
+    segment whose midpoint lies further than tolerance (relative to the
+    envelope size) from its chord, for at most max_level passes.
+
+    Returns a dictionary with the a and b intercepts (aMin, aMax, bMin,
+    bMax) and the closed envelope curve (aPlot, bPlot). The curve starts at
+    aMin, runs over the b > 0 half to aMax and returns under it. Directions
+    that never fail are left out of the curve.
+    """
+    # Always include the four intercept directions
+    n_start = 4 * max(int(np.ceil(n_start / 4.0)), 1)
+    phi = np.linspace(np.pi, -np.pi, n_start+1)
+    a, b = make_envelope_points(N, M, analysis, phi, criterion, location)
+    quarter = n_start // 4
+    aMin, bMax, aMax, bMin = a[0], b[quarter], a[2*quarter], b[3*quarter]
+
+    finite = np.isfinite(a) & np.isfinite(b)
+    size = max(np.ptp(a[finite]), np.ptp(b[finite])) if finite.any() else 1.0
+    active = finite[:-1] & finite[1:]
+    level = 0
+    while active.any() and level < max_level:
+        seg = np.flatnonzero(active)
+        midPhi = (phi[seg] + phi[seg+1]) / 2
+        midA, midB = make_envelope_points(N, M, analysis, midPhi, criterion,
+                                          location)
+
+        # Distance of each new point from the chord it splits
+        chordA = a[seg+1] - a[seg]
+        chordB = b[seg+1] - b[seg]
+        length = np.hypot(chordA, chordB)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            offset = np.abs(chordA*(midB - b[seg]) - chordB*(midA - a[seg]))
+            offset = offset / np.where(length > 0, length, np.inf) / size
+        refine = np.isfinite(midA) & np.isfinite(midB) & (offset > tolerance)
+
+        # Both halves of a refined segment stay active
+        phi = np.insert(phi, seg+1, midPhi)
+        a = np.insert(a, seg+1, midA)
+        b = np.insert(b, seg+1, midB)
+        newActive = np.zeros(len(phi)-1, dtype=bool)
+        newActive[seg + np.arange(len(seg))] = refine
+        newActive[seg + np.arange(len(seg)) + 1] = refine
+        active = newActive
+        level += 1
+
+        if verbose:
+            print('level {lv}: {pts} points, {act} segments refined'.format(
+                  lv=level, pts=len(phi), act=int(refine.sum())))
+
+    keep = np.isfinite(a) & np.isfinite(b)
+    if verbose:
+        print('{amin:.5g} <= a0 <= {amax:.5g}'.format(amin=aMin, amax=aMax))
+        print('{bmin:.5g} <= b0 <= {bmax:.5g}'.format(bmin=bMin, bmax=bMax))
+
+    dictOut = {'aMin':aMin, 'aMax':aMax, 'bMin':bMin, 'bMax':bMax,\
+               'aPlot':a[keep], 'bPlot':b[keep]}
+    return dictOut
@@ -0,0 +1,79 @@
+"""First ply failure surfaces of thin plates in 3D resultant space.
+
+A failure surface is built in either force (Nx, Ny, Nxy) or moment
+(Mx, My, Mxy) space by casting rays from the origin and taking the exact
+failure load factor of each ray from ThinPlates.make_reserve_factors. The
+rays are spread evenly over the unit sphere, so their convex hull gives a
+triangulation that carries straight over to the surface points.
+
+The convex hull of the surface points is used as a safe region. Each hull
+vertex lies on the true surface, so the hull lies inside the failure region
+whenever that region is convex. The stresses are linear in the resultants
+and the region is the intersection of the ply regions, so it is convex for
+maxstress and maxstrain, and for Hoffman and Tsai-Wu as long as their
+quadratic strength tensor is positive semi-definite (as it is for any
+usual set of strengths). Tsai-Hill switches its strengths with the sign of
+the normal stresses, which leaves a concave kink wherever the tension and
+compression strengths differ, so it is not accepted.
+"""
+import numpy as np
+import scipy.spatial as spatial
+
+def make_ray_directions(n_rays):
+    """Returns n_rays nearly uniform unit vectors on a Fibonacci sphere."""
+    k = np.arange(n_rays) + 0.5
+    polar = np.arccos(1 - 2*k/n_rays)
+    azimuth = np.pi * (1 + 5**0.5) * k
+    return np.stack([np.cos(azimuth)*np.sin(polar),
+                     np.sin(azimuth)*np.sin(polar),
+                     np.cos(polar)], axis=-1)
+
+class FailureSurface(object):
+    """The first ply failure surface of a ThinPlates analysis.
+
+    space is 'N' for force resultants or 'M' for moment resultants. The
+    surface is triangulated in Triangles, indexing the rows of Points. Rays
+    that never fail have infinite Points and are left out of the safe
+    region Hull. Tetrahedra fills the hull for fast inside tests.
+    """
+
+    def __init__(self, analysis, space='N', n_rays=2000, criterion='hoffman',
+                 location='mid'):
+        if space not in ('N', 'M'):
+            raise KeyError('Resultant space must be N or M')
+        if criterion == 'tsaihill':
+            raise ValueError('Tsai-Hill failure regions are not convex, so '
+                             'their hull is not a safe region')
+        self.Space = space
+        self.Criterion = criterion
+        self.Directions = make_ray_directions(int(n_rays))
+
+        # All rays are solved in a single batch
+        R = np.zeros((6, self.Directions.shape[0]))
+        rows = slice(0,3) if space == 'N' else slice(3,6)
+        R[rows] = self.Directions.T
+        result = analysis.make_reserve_factors(R, criterion, location)
+        self.ReserveFactor = result['ReserveFactor']
+        self.GoverningPly = result['Ply']
+        self.GoverningMode = result['Mode']
+
+        with np.errstate(invalid='ignore'):
+            self.Points = self.ReserveFactor[:,None] * self.Directions
+        self.Triangles = spatial.ConvexHull(self.Directions).simplices
+        finite = np.isfinite(self.ReserveFactor)
+        self.Hull = spatial.ConvexHull(self.Points[finite])
+        corners = self.Hull.points[self.Hull.vertices]
+        self.Tetrahedra = spatial.Delaunay(corners)
+
+    def check_inside(self, loads, tolerance=0.0):
+        """Returns a boolean array, True for every load inside the safe
+        region.
+
+        loads is a (K,3) array of resultants in the surface space. The test
+        is a point location in a Delaunay tetrahedralization of the safe
+        region, which scales to millions of loads. A positive tolerance
+        scales the loads up by (1 + tolerance) first, making the test
+        conservative by that fraction.
+        """
+        loads = np.atleast_2d(np.asarray(loads, dtype=float))
+        return self.Tetrahedra.find_simplex(loads * (1 + tolerance)) >= 0
@@ -0,0 +1,161 @@
+"""Variable stiffness laminates whose fibre angles change over a mesh.
+
+Steered and draped parts give every element of a mesh its own stack, all
+sharing the ply thicknesses and materials of one reference laminate. The
+Q-bar of a ply, and its Q-bar times CTE, are linear in the harmonics
+(1, cos 2t, sin 2t, cos 4t, sin 4t) of its angle t. Every ABD term is then
+a fixed weight matrix times the harmonics of the ply angles, so a block of
+elements costs one matrix product and no per-element laminate is built.
+
+When every ply of an element is turned by the same offset, the harmonics
+of the turned plies are a rotation of the reference ones. Their
+through-thickness sums can then be formed once, so the cost per element
+does not depend on the number of plies.
+
+Results are produced in chunks of elements, so a mesh larger than memory
+can be streamed to .npy files with chunked_output, as in design_sweep.
+"""
+import numpy as np
+import batch_plates as bp
+import chunked_output as co
+import laminate_fundamentals as lf
+
+def make_harmonics(orientations):
+    """Returns the (..., 5) angle harmonics (1, cos 2t, sin 2t, cos 4t,
+    sin 4t) of an array of orientations in degrees.
+    """
+    theta = np.radians(np.asarray(orientations, dtype=float))
+    return np.stack([np.ones_like(theta), np.cos(2*theta), np.sin(2*theta),
+                     np.cos(4*theta), np.sin(4*theta)], axis=-1)
+
+def make_harmonic_coefficients(table):
+    """Returns the (materials, 5, 12) coefficients taking angle harmonics to
+    the 9 Q-bar terms and 3 Q-bar times CTE terms of a ply.
+
+    The coefficients are recovered from make_ply_stiffness at a set of
+    sample angles, so they match the batch kernels to round-off.
+    """
+    sample = np.arange(12) * 15.0
+    nMatl = table['U'].shape[0]
+    index = np.broadcast_to(np.arange(nMatl)[:,None], (nMatl, sample.size))
+    Q, cte = bp.make_ply_stiffness(np.broadcast_to(sample, index.shape),
+                                   index, table)
+    values = np.concatenate((Q.reshape(nMatl, sample.size, 9),
+                             np.einsum('msij,msj->msi', Q, cte)), axis=-1)
+    coef = np.linalg.lstsq(make_harmonics(sample),
+                           values.transpose(1,0,2).reshape(sample.size, -1),
+                           rcond=None)[0]
+    return coef.reshape(5, nMatl, 12).transpose(1,0,2)
+
+def make_harmonic_rotations(offsets):
+    """Returns the (..., 5, 5) matrices taking the harmonics of an angle to
+    those of the angle turned by offsets degrees.
+    """
+    phi = np.radians(np.asarray(offsets, dtype=float))
+    R = np.zeros(phi.shape + (5,5))
+    R[...,0,0] = 1
+    for row, turn in ((1, 2*phi), (3, 4*phi)):
+        c = np.cos(turn)
+        s = np.sin(turn)
+        R[...,row,row] = R[...,row+1,row+1] = c
+        R[...,row,row+1] = -s
+        R[...,row+1,row] = s
+    return R
+
+class FieldLaminate(object):
+    """A reference laminate with a fibre angle field over mesh elements.
+
+    reference is a Laminate or PackedLaminate. Give either offsets, an
+    (elements,) array turning the whole stack of each element or an
+    (elements, plies) array turning each ply, or angles, the full
+    (elements, plies) orientations that replace the reference ones.
+    Either array may be a memory map, as only one chunk is read at a time.
+    """
+
+    def __init__(self, reference, offsets=None, angles=None):
+        if isinstance(reference, lf.Laminate):
+            reference = lf.PackedLaminate.from_laminate(reference)
+        assert isinstance(reference, lf.PackedLaminate), \
+            'Reference must be a Laminate or PackedLaminate'
+        if (offsets is None) == (angles is None):
+            raise ValueError('Give exactly one of offsets or angles')
+        self.Reference = reference
+        self.Offsets = offsets
+        self.Angles = angles
+        field = offsets if angles is None else angles
+        nPly = len(reference)
+        if np.ndim(field) == 2 and np.shape(field)[1] != nPly:
+            raise ValueError('Field arrays need one column per reference ply')
+        if angles is not None and np.ndim(angles) != 2:
+            raise ValueError('Angles must be an (elements, plies) array')
+        self.Rigid = angles is None and np.ndim(offsets) == 1
+        self.Elements = np.shape(field)[0]
+        self.MaterialTable = bp.make_material_table(reference.Materials)
+
+    def make_weights(self):
+        """Returns the (plies, 5, 30) weights taking the angle harmonics of
+        each ply to the flattened A, B, D and specific NT terms.
+        """
+        try:
+            return self.Weights
+        except AttributeError:
+            h = bp.make_z_weights(self.Reference.Thicknesses)[:,0,:]
+            coef = make_harmonic_coefficients(self.MaterialTable)[
+                   self.Reference.MaterialIndex]
+            self.Weights = np.concatenate((h[0,:,None,None] * coef[...,:9],
+                                           h[1,:,None,None] * coef[...,:9],
+                                           h[2,:,None,None] * coef[...,:9],
+                                           h[0,:,None,None] * coef[...,9:]),
+                                          axis=-1)
+            return self.Weights
+
+    def make_rotation_table(self):
+        """Returns the (25, 30) table taking the flattened harmonic rotation
+        of a whole stack offset to its flattened A, B, D and specific NT.
+        """
+        try:
+            return self.RotationTable
+        except AttributeError:
+            G = np.einsum('pi,pjm->jim', make_harmonics(
+                          self.Reference.Orientations), self.make_weights())
+            self.RotationTable = G.reshape(25, -1)
+            return self.RotationTable
+
+    def make_chunk(self, start, stop):
+        """Evaluates elements start to stop. Returns a dictionary of their
+        (elements,6,6) ABD and (elements,3) specificNT.
+        """
+        if self.Rigid:
+            R = make_harmonic_rotations(self.Offsets[start:stop])
+            flat = R.reshape(-1, 25).dot(self.make_rotation_table())
+        else:
+            if self.Angles is None:
+                angles = self.Reference.Orientations + \
+                         np.asarray(self.Offsets[start:stop], dtype=float)
+            else:
+                angles = self.Angles[start:stop]
+            W = self.make_weights()
+            flat = make_harmonics(angles).reshape(-1, W.shape[0]*5).dot(
+                   W.reshape(-1, W.shape[-1]))
+
+        nElem = flat.shape[0]
+        ABD = np.empty((nElem,6,6))
+        ABD[:,0:3,0:3] = flat[:,0:9].reshape(-1,3,3)
+        ABD[:,0:3,3:] = flat[:,9:18].reshape(-1,3,3)
+        ABD[:,3:,0:3] = ABD[:,0:3,3:]
+        ABD[:,3:,3:] = flat[:,18:27].reshape(-1,3,3)
+        return {'ABD':ABD, 'specificNT':flat[:,27:]}
+
+    def evaluate(self, chunk=100000):
+        """Evaluates every element in memory, chunk elements at a time, and
+        returns the dictionary of ABD and specificNT arrays.
+        """
+        return co.evaluate_chunks(self.make_chunk, self.Elements, chunk)
+
+    def stream(self, directory, chunk=100000, outputs=None):
+        """Evaluates the elements chunk by chunk into one .npy file per
+        output in directory, so memory use is set by chunk and not by the
+        mesh. Returns a dictionary of read-only memory maps of the files.
+        """
+        return co.stream_chunks(self.make_chunk, self.Elements, directory,
+                                chunk, outputs)
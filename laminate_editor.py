@@ -0,0 +1,205 @@
+"""Editable thin laminates with incrementally updated ABD matrices.
+
+LaminateEditor keeps the packed ply arrays of a laminate together with the
+first three through-thickness moments of its ply stiffnesses, taken about
+a fixed reference plane rather than the mid-plane. A, B, D and the specific
+NT follow from these moments by a parallel axis shift to the current
+mid-plane, so an edit only has to patch the moments:
+
+- changing a ply angle only swaps that ply's contribution, O(1),
+- swapping plies of equal thickness swaps two contributions, O(1),
+- edits that move plies (thickness changes, insertions, deletions and
+  swaps of unequal plies) shift whole blocks of plies with one parallel
+  axis update per block, always shifting the smaller side of the edit.
+
+Round-off from long edit sequences can be cleared with rebuild.
+"""
+import numpy as np
+import laminate_fundamentals as lf
+import batch_plates as bp
+
+class LaminateEditor(object):
+    """Single ply edits of a laminate with patched A, B, D and specific NT.
+
+    Plies are numbered from the tool side as in PlyStack. After any edit the
+    A, B, D, ABD and specificNT attributes are current and match a full
+    ThinPlates rebuild of the edited stack. They are plain arrays patched in
+    place, with A, B and D views into ABD, so copy them to keep the values
+    from before an edit.
+    """
+
+    def __init__(self, laminate):
+        if isinstance(laminate, lf.Laminate):
+            laminate = laminate.pack()
+        assert isinstance(laminate, lf.PackedLaminate), 'Input not a laminate'
+        self.Materials = list(laminate.Materials)
+        self.MaterialTable = bp.make_material_table(self.Materials)
+        self.Orientations = laminate.Orientations.copy()
+        self.Thicknesses = laminate.Thicknesses.copy()
+        self.MaterialIndex = laminate.MaterialIndex.copy()
+        self.rebuild()
+
+    def rebuild(self):
+        """Recomputes every ply contribution from scratch, with the reference
+        plane reset to the current mid-plane.
+        """
+        self.PlyStiffness, cte = bp.make_ply_stiffness(self.Orientations,
+                                 self.MaterialIndex, self.MaterialTable)
+        self.PlyThermal = np.einsum('pij,pj->pi', self.PlyStiffness, cte)
+        self.zLow = np.cumsum(self.Thicknesses) - self.Thicknesses \
+                    - self.Thicknesses.sum()/2
+        h = self._make_weights(self.zLow, self.Thicknesses)
+        self.Moments = np.einsum('kp,pij->kij', h, self.PlyStiffness)
+        self.ThermalMoment = np.einsum('p,pi->i', h[0], self.PlyThermal)
+        self.TotalThickness = float(self.Thicknesses.sum())
+        # A, B and D are views into ABD, all patched in place by _update
+        self.ABD = np.zeros((6,6))
+        self.A = self.ABD[0:3,0:3]
+        self.B = self.ABD[0:3,3:]
+        self.D = self.ABD[3:,3:]
+        self.specificNT = np.zeros((3,1))
+        self._update()
+
+    def _make_weights(self, zLow, thk):
+        # Integration weights of plies about the reference plane
+        zUp = zLow + thk
+        return np.stack([zUp - zLow, (zUp**2 - zLow**2)/2,
+                         (zUp**3 - zLow**3)/3])
+
+    def _add_ply(self, ply, sign):
+        # Adds (sign=1) or removes (sign=-1) one ply's contribution
+        h = self._make_weights(self.zLow[ply], self.Thicknesses[ply])
+        self.Moments += sign * h[:,None,None] * self.PlyStiffness[ply]
+        self.ThermalMoment += sign * h[0] * self.PlyThermal[ply]
+
+    def _shift(self, block, delta):
+        # Moves a block of plies by delta with a parallel axis update
+        if delta == 0 or not self.Thicknesses[block].size:
+            return
+        h = self._make_weights(self.zLow[block], self.Thicknesses[block])
+        S0 = np.einsum('p,pij->ij', h[0], self.PlyStiffness[block])
+        S1 = np.einsum('p,pij->ij', h[1], self.PlyStiffness[block])
+        self.Moments[1] += delta * S0
+        self.Moments[2] += 2*delta*S1 + delta**2*S0
+        self.zLow[block] += delta
+
+    def _make_ply(self, orientation, material_index):
+        Q, cte = bp.make_ply_stiffness(np.array([orientation]),
+                 np.array([material_index]), self.MaterialTable)
+        return Q[0], Q[0].dot(cte[0])
+
+    def _update(self):
+        # Parallel axis shift of the moments to the current mid-plane, which
+        # sits half the running total thickness above the first ply
+        if len(self.Thicknesses):
+            self.MidPlane = self.zLow[0] + self.TotalThickness/2
+        else:
+            self.MidPlane = 0.0
+        c = self.MidPlane
+        M0, M1, M2 = self.Moments
+        self.A[...] = M0
+        np.subtract(M1, c*M0, out=self.B)
+        np.subtract(M2, 2*c*M1 - c**2*M0, out=self.D)
+        self.ABD[3:,0:3] = self.B
+        self.specificNT[:,0] = self.ThermalMoment
+
+    def _move_side(self, ply, delta):
+        # Makes room for a thickness change of delta at ply by moving the
+        # smaller side. Returns the new bottom of the ply.
+        n = len(self.Thicknesses)
+        if n - ply - 1 <= ply:
+            self._shift(slice(ply+1, n), delta)
+            return self.zLow[ply]
+        self._shift(slice(0, ply), -delta)
+        return self.zLow[ply] - delta
+
+    def set_orientation(self, ply, orientation):
+        """Changes the angle of one ply, O(1)."""
+        self._add_ply(ply, -1)
+        self.PlyStiffness[ply], self.PlyThermal[ply] = self._make_ply(
+            orientation, self.MaterialIndex[ply])
+        self.Orientations[ply] = orientation
+        self._add_ply(ply, 1)
+        self._update()
+
+    def set_thickness(self, ply, thickness):
+        """Changes the thickness of one ply, moving the smaller side."""
+        self._add_ply(ply, -1)
+        delta = thickness - self.Thicknesses[ply]
+        self.zLow[ply] = self._move_side(ply, delta)
+        self.Thicknesses[ply] = thickness
+        self.TotalThickness += delta
+        self._add_ply(ply, 1)
+        self._update()
+
+    def insert_ply(self, ply, orientation, thickness, material_index=0):
+        """Inserts a new ply so that it becomes ply number ply."""
+        n = len(self.Thicknesses)
+        if n == 0:
+            zLow = -thickness/2
+        elif n - ply <= ply:
+            zLow = self.zLow[ply] if ply < n else \
+                   self.zLow[-1] + self.Thicknesses[-1]
+            self._shift(slice(ply, n), thickness)
+        else:
+            zLow = self.zLow[ply] - thickness
+            self._shift(slice(0, ply), -thickness)
+
+        Q, thermal = self._make_ply(orientation, material_index)
+        self.Orientations = np.insert(self.Orientations, ply, orientation)
+        self.Thicknesses = np.insert(self.Thicknesses, ply, thickness)
+        self.MaterialIndex = np.insert(self.MaterialIndex, ply, material_index)
+        self.zLow = np.insert(self.zLow, ply, zLow)
+        self.PlyStiffness = np.insert(self.PlyStiffness, ply, Q, axis=0)
+        self.PlyThermal = np.insert(self.PlyThermal, ply, thermal, axis=0)
+        self.TotalThickness += thickness
+        self._add_ply(ply, 1)
+        self._update()
+
+    def delete_ply(self, ply):
+        """Removes one ply, closing the gap from the smaller side."""
+        self._add_ply(ply, -1)
+        n = len(self.Thicknesses)
+        if n - ply - 1 <= ply:
+            self._shift(slice(ply+1, n), -self.Thicknesses[ply])
+        else:
+            self._shift(slice(0, ply), self.Thicknesses[ply])
+        self.TotalThickness -= self.Thicknesses[ply]
+
+        self.Orientations = np.delete(self.Orientations, ply)
+        self.Thicknesses = np.delete(self.Thicknesses, ply)
+        self.MaterialIndex = np.delete(self.MaterialIndex, ply)
+        self.zLow = np.delete(self.zLow, ply)
+        self.PlyStiffness = np.delete(self.PlyStiffness, ply, axis=0)
+        self.PlyThermal = np.delete(self.PlyThermal, ply, axis=0)
+        self._update()
+
+    def swap_plies(self, first, second):
+        """Exchanges two plies. O(1) when their thicknesses are equal,
+        otherwise the plies between them are shifted.
+        """
+        i, j = sorted((first, second))
+        if i == j:
+            return
+        self._add_ply(i, -1)
+        self._add_ply(j, -1)
+        delta = self.Thicknesses[j] - self.Thicknesses[i]
+        self._shift(slice(i+1, j), delta)
+        zTop = self.zLow[j] + self.Thicknesses[j]
+
+        for array in (self.Orientations, self.Thicknesses, self.MaterialIndex,
+                      self.PlyStiffness, self.PlyThermal):
+            array[[i, j]] = array[[j, i]]
+        self.zLow[j] = zTop - self.Thicknesses[j]
+        self._add_ply(i, 1)
+        self._add_ply(j, 1)
+        self._update()
+
+    def make_global_stiffness(self):
+        """Returns the current augmented ABD matrix."""
+        return self.ABD
+
+    def to_packed(self):
+        """Returns the edited stack as a PackedLaminate."""
+        return lf.PackedLaminate(self.Orientations, self.Thicknesses,
+                                 self.MaterialIndex, self.Materials)
@@ -1,4 +1,4 @@
-from copy import deepcopy
+import numpy as np
 import property_interface
 
 """Defines the two fundamental types required for all laminate analysis.
@@ -43,6 +43,11 @@ class Laminate(object):
     class also provides functions to build laminates that are symetric and/or
     with repeating units. It is assumed that the list starts with the
     tool side.
+
+    Repeats and the mirrored half are not copied. Only the plies given to
+    the constructor are stored, in BasePlies, and PlyIndex maps every
+    position of the expanded stack onto them. Plies and their materials are
+    therefore shared by reference between repeats.
     """
 
     def __init__(self, ply_book=None, n_count=1, symmetry=False):
@@ -55,24 +60,26 @@ class Laminate(object):
         # tricks can be used.
         self.Symmetry = bool(symmetry)
         self.nCount = int(n_count)
+        self.BasePlies = list(ply_book)
 
-        # Can't use list operators because deep copies are needed.
-        for ct in range(self.nCount-1):
-            temp_list = list()
-            for ply in ply_book:
-                temp_ply = deepcopy(ply)
-                temp_list += [temp_ply]
-                ply_book = ply_book + temp_list
-
-        # Fancy slice adding the reverse back to itself
+        # Repeat the base sublaminate, then add the reverse back to itself.
+        index = np.tile(np.arange(len(self.BasePlies), dtype=np.intp),
+                        max(self.nCount, 1))
         if self.Symmetry:
-            temp_list = list()
-            for ply in ply_book[::-1]:
-                temp_ply = deepcopy(ply)
-                temp_list += [temp_ply]
-            ply_book += temp_list
+            index = np.concatenate((index, index[::-1]))
+        self.PlyIndex = index
+
+    @property
+    def PlyStack(self):
+        """The expanded stack as a list of (shared) Ply objects."""
+        return [self.BasePlies[idx] for idx in self.PlyIndex.tolist()]
 
-        self.PlyStack = ply_book
+    def __len__(self):
+        return self.PlyIndex.shape[0]
+
+    def pack(self):
+        """Returns the array-backed PackedLaminate form of this laminate."""
+        return PackedLaminate.from_laminate(self)
 
     def __str__(self):
         # The string output is functionally the same as the representation
@@ -87,3 +94,121 @@ class Laminate(object):
 
     def toXML(self):
         raise NotImplementedError
+
+
+class PackedLaminate(object):
+    """A laminate stored as a structure of arrays instead of a list of plies.
+
+    Orientations and thicknesses are contiguous float64 arrays and each ply
+    refers to its material through an integer index into a shared material
+    table. Analyses that work ply by ply on the arrays avoid all the
+    per-object overhead of walking a PlyStack. Like Laminate, the arrays
+    start with the tool side and hold the fully expanded stack.
+    """
+
+    def __init__(self, orientations, thicknesses, material_index=None,
+                 materials=None, symmetry=False):
+        self.Orientations = np.ascontiguousarray(orientations, dtype=np.float64)
+        self.Thicknesses = np.ascontiguousarray(np.broadcast_to(thicknesses,
+                           self.Orientations.shape), dtype=np.float64)
+        if material_index is None:
+            material_index = np.zeros(self.Orientations.shape)
+        self.MaterialIndex = np.ascontiguousarray(np.broadcast_to(
+                             material_index, self.Orientations.shape),
+                             dtype=np.intp)
+        assert materials is not None, \
+            'Packed laminates need the list of materials their index refers to'
+        self.Materials = list(materials)
+        self.Symmetry = bool(symmetry)
+
+        assert self.Orientations.ndim == 1, 'Packed laminates are 1D'
+        for matl in self.Materials:
+            assert isinstance(matl, property_interface.Material)
+        if len(self):
+            assert 0 <= self.MaterialIndex.min() and \
+                   self.MaterialIndex.max() < len(self.Materials), \
+                   'Material index out of range of the material table'
+
+    @classmethod
+    def from_laminate(cls, laminate):
+        """Packs a Laminate. Materials are shared by reference, and plies
+        holding the same Material object get the same index.
+        """
+        assert isinstance(laminate, Laminate)
+        materials = list()
+        lookup = dict()
+        base_index = list()
+        for ply in laminate.BasePlies:
+            key = id(ply.Material)
+            if key not in lookup:
+                lookup[key] = len(materials)
+                materials.append(ply.Material)
+            base_index.append(lookup[key])
+        base_orient = np.array([ply.Orientation for ply in laminate.BasePlies])
+        base_thk = np.array([ply.Thickness for ply in laminate.BasePlies])
+        base_index = np.array(base_index, dtype=np.intp)
+        return cls(base_orient[laminate.PlyIndex], base_thk[laminate.PlyIndex],
+                   base_index[laminate.PlyIndex], materials, laminate.Symmetry)
+
+    def to_plies(self):
+        """Returns the stack as a list of new Ply objects."""
+        return [Ply({'matl':self.Materials[idx], 'thk':thk, 'orient':orient})
+                for orient, thk, idx in zip(self.Orientations.tolist(),
+                self.Thicknesses.tolist(), self.MaterialIndex.tolist())]
+
+    def to_laminate(self):
+        """Returns an equivalent Laminate. The stack is already expanded, so
+        it is not mirrored again, only the symmetry flag is carried over.
+        """
+        laminate = Laminate(self.to_plies())
+        laminate.Symmetry = self.Symmetry
+        return laminate
+
+    def make_reduced_orientations(self):
+        """Returns the orientations wrapped into [-90, 90) degrees, so that
+        plies differing by 180 degrees compare equal.
+        """
+        return (self.Orientations + 90) % 180 - 90
+
+    def check_symmetry(self):
+        """Returns True if the stack is a mirror image about its mid-plane."""
+        orient = self.make_reduced_orientations()
+        return bool(np.array_equal(orient, orient[::-1]) and \
+               np.array_equal(self.Thicknesses, self.Thicknesses[::-1]) and \
+               np.array_equal(self.MaterialIndex, self.MaterialIndex[::-1]))
+
+    def check_balance(self):
+        """Returns True if every off-axis ply has a -theta partner of the same
+        material and thickness somewhere in the stack.
+        """
+        orient = self.make_reduced_orientations()
+        mirror = (90 - orient) % 180 - 90
+        keys = [self.MaterialIndex, self.Thicknesses]
+        plus = np.lexsort(keys + [orient])
+        minus = np.lexsort(keys + [mirror])
+        return bool(np.array_equal(orient[plus], mirror[minus]) and \
+               np.array_equal(self.Thicknesses[plus], self.Thicknesses[minus]) \
+               and np.array_equal(self.MaterialIndex[plus],
+                                  self.MaterialIndex[minus]))
+
+    def make_densities(self):
+        """Returns the density of every ply as an array."""
+        density = np.array([float(matl.Density) for matl in self.Materials])
+        return density[self.MaterialIndex]
+
+    def __len__(self):
+        return self.Orientations.shape[0]
+
+    def __str__(self):
+        # The string output is functionally the same as the representation
+        return self.__repr__()
+
+    def __repr__(self):
+        output  = '--PackedLaminate--\n'
+        output += 'symmetry? '+str(self.Symmetry)+'\n'
+        output += 'orientations = '+str(self.Orientations)+'\n'
+        output += 'thicknesses = '+str(self.Thicknesses)+'\n'
+        output += 'material index = '+str(self.MaterialIndex)+'\n'
+        for idx, matl in enumerate(self.Materials):
+            output += str(idx)+': '+matl.__repr__()+'\n'
+        return output
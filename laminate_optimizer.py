@@ -0,0 +1,139 @@
+"""Continuous optimization of [a_m/-a_m/0_n/90_n/0_n/-a_m/a_m] laminates.
+
+This is the SimpleOptimizer of oldSauce rebuilt on the batched kernels. The
+objective takes a whole differential evolution population at once as a
+(3, S) array of (a, m, n) columns. The laminate is
+layup_templates.make_amn_template, symmetric with a single 90_n block at
+the mid-plane, whose blocks of identical plies are
+integrated in closed form, so a candidate costs the same whatever its ply
+count.
+
+PopulationEvaluator can split each population over a process pool. Every
+column is evaluated on its own, so the result is the same for any number of
+workers and a seeded run is fully reproducible.
+"""
+import os
+import multiprocessing
+import numpy as np
+import scipy.optimize as opt
+import thin_plates as tp
+import layup_templates as lt
+
+def make_strain_limited_thickness(x, material, forces, strain_limits):
+    """Returns the thickness of each candidate laminate, or infinity where a
+    mid-plane strain or curvature exceeds its limit in magnitude.
+
+    x is (3,) or (3,S) as passed by differential_evolution, forces the six
+    resultants and strain_limits the six strain and curvature limits.
+    """
+    a, m, n = np.asarray(x, dtype=float).reshape(3,-1)
+    # Ply counts are truncated to integers as in oldSauce
+    params = {'a':a, 'm':np.floor(m), 'n':np.floor(n)}
+    template = lt.make_amn_template(material)
+    ABD, _ = template.make_stiffness(**params)
+    forces = np.asarray(forces, dtype=float).reshape(6)
+    strains = np.linalg.solve(ABD, np.broadcast_to(forces[:,None],
+                              (ABD.shape[0],6,1)))[...,0]
+    limits = np.asarray(strain_limits, dtype=float).reshape(6)
+    acceptable = np.all(np.abs(strains) <= limits, axis=-1)
+    thk = template.make_counts(**params).sum(axis=-1) * \
+          float(material.Thickness)
+    thk = np.where(acceptable, thk, np.inf)
+    return thk if np.ndim(x) > 1 else thk[0]
+
+# Objective and arguments held by each worker process
+_worker = {}
+
+def _init_worker(func, args):
+    _worker['func'] = func
+    _worker['args'] = args
+
+def _evaluate(x):
+    return _worker['func'](x, *_worker['args'])
+
+class PopulationEvaluator(object):
+    """A vectorized objective that spreads each population over a process
+    pool.
+
+    func must be a module level function taking a (parameters, S) array and
+    args, and returning S values. It and args are sent to each worker once,
+    so only the candidates travel per call. workers=-1 uses every CPU and
+    workers=1 evaluates in this process. Use as a context manager, or call
+    close, so the pool is shut down.
+    """
+
+    def __init__(self, func, args=(), workers=1):
+        self.Function = func
+        self.Args = tuple(args)
+        if workers == -1:
+            workers = os.cpu_count() or 1
+        self.Workers = max(int(workers), 1)
+        self.Pool = None
+        if self.Workers > 1:
+            self.Pool = multiprocessing.Pool(self.Workers,
+                        initializer=_init_worker, initargs=(func, self.Args))
+
+    def __call__(self, x):
+        x = np.asarray(x, dtype=float)
+        if self.Pool is None or x.ndim == 1 or x.shape[1] < 2*self.Workers:
+            return self.Function(x, *self.Args)
+        chunks = np.array_split(x, self.Workers, axis=1)
+        return np.concatenate(self.Pool.map(_evaluate, chunks))
+
+    def close(self):
+        """Stops the worker processes once their work is done."""
+        if self.Pool is not None:
+            self.Pool.close()
+            self.Pool.join()
+            self.Pool = None
+
+    def terminate(self):
+        """Stops the worker processes immediately."""
+        if self.Pool is not None:
+            self.Pool.terminate()
+            self.Pool.join()
+            self.Pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
+        return False
+
+def make_simple_optimum(material, forces, strain_limits,
+                        bounds=((0,90),(1,100),(1,100)), seed=599, workers=1,
+                        popsize=10, maxiter=5000, tol=1e-5, disp=False):
+    """Finds the thinnest [a_m/-a_m/0_n/90_n/0_n/-a_m/a_m] laminate of one
+    material that keeps every mid-plane strain and curvature within its
+    limit.
+
+    Runs a seeded, vectorized differential evolution on workers processes.
+    Returns a dictionary with the scipy result (Optimum), the optimal
+    laminate and its ThinPlates analysis, the resulting strains and a text
+    summary (Message).
+    """
+    args = (material, forces, strain_limits)
+    with PopulationEvaluator(make_strain_limited_thickness, args,
+                             workers) as objective:
+        optimum = opt.differential_evolution(objective, bounds,
+                  popsize=popsize, maxiter=maxiter, tol=tol,
+                  mutation=(0.5, 1), recombination=0.7, seed=seed, disp=disp,
+                  polish=False, vectorized=True, updating='deferred')
+
+    a, m, n = optimum.x[0], int(optimum.x[1]), int(optimum.x[2])
+    laminate = lt.make_amn_template(material).make_laminate(a=a, m=m,
+                                                           n=n).to_laminate()
+    plate = tp.ThinPlates(laminate)
+    strains = plate.solve_resultants(np.asarray(forces, dtype=float).ravel())
+
+    output = optimum.message
+    output += '\na= {a:.3f}deg m= {m} n= {n}'.format(a=a, m=m, n=n)
+    output += '\nex={ex:.3e} ey={ey:.3e} exy={exy:.3e}'.format(
+              ex=strains[0], ey=strains[1], exy=strains[2])
+    output += '\nthickness={t:.4g}'.format(t=plate.TotalThickness)
+    return {'Optimum':optimum, 'Laminate':laminate, 'Analysis':plate,
+            'Strains':strains, 'Message':output}
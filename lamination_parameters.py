@@ -0,0 +1,84 @@
+"""Lamination parameter description of thin single-material laminates.
+
+Any stack of one Plate2D material is fully described in CLPT by its total
+thickness and 12 lamination parameters, the thickness averaged cos2, sin2,
+cos4 and sin4 of the ply angles for each of the A, B and D integrals. The
+ABD matrix is then a linear combination of five constant invariant
+matrices built from U1 to U5. This allows designs to be screened in
+lamination parameter space without ever building a stack.
+
+Parameters are ordered [V1A, V2A, V3A, V4A, V1B, ..., V4B, V1D, ..., V4D],
+where 1 to 4 refer to cos2, sin2, cos4 and sin4. See wiki for the
+normalization used.
+"""
+import numpy as np
+import batch_plates as bp
+
+def make_invariant_matrices(material):
+    """Returns the (5,3,3) invariant matrices of a Plate2D material.
+
+    Row 0 is the angle independent part of Q-bar, rows 1 to 4 multiply the
+    cos2, sin2, cos4 and sin4 lamination parameters respectively.
+    """
+    U1, U2, U3, U4, U5 = [float(u) for u in material.make_invariants()]
+    return np.array([
+        [[U1, U4, 0], [U4, U1, 0], [0, 0, U5]],
+        [[U2, 0, 0], [0, -U2, 0], [0, 0, 0]],
+        [[0, 0, U2/2], [0, 0, U2/2], [U2/2, U2/2, 0]],
+        [[U3, -U3, 0], [-U3, U3, 0], [0, 0, -U3]],
+        [[0, 0, U3], [0, 0, -U3], [U3, -U3, 0]]])
+
+def make_thermal_vectors(material):
+    """Returns the (3,3) thermal invariant vectors of a Plate2D material.
+
+    The product of Q-bar and the transformed CTE is a rotated stress vector,
+    so the specific NT only depends on the cos2 and sin2 parameters. Rows are
+    the constant, cos2 and sin2 parts.
+    """
+    Q = np.asarray(material.make_stiffness())
+    sig = Q.dot([float(material.CTE_1), float(material.CTE_2), 0])
+    mean = (sig[0] + sig[1]) / 2
+    diff = (sig[0] - sig[1]) / 2
+    return np.array([[mean, mean, 0], [diff, -diff, 0], [0, 0, diff]])
+
+def make_lamination_parameters(orientations, thicknesses):
+    """Returns the (N,12) lamination parameters and (N,) total thickness of a
+    batch of laminates.
+
+    Inputs are padded (laminates x plies) arrays as used in batch_plates.
+    A single laminate may be given as 1D arrays, giving a (1,12) result.
+    """
+    theta = np.radians(np.atleast_2d(np.asarray(orientations, dtype=float)))
+    thicknesses = np.broadcast_to(thicknesses, theta.shape)
+    h = bp.make_z_weights(thicknesses)
+    total = h[0].sum(axis=-1)
+
+    trig = np.stack([np.cos(2*theta), np.sin(2*theta),
+                     np.cos(4*theta), np.sin(4*theta)], axis=-1)
+    scale = np.stack([1/total, 4/total**2, 12/total**3])
+    params = np.einsum('knp,npi->nki', h, trig) * scale.T[:,:,None]
+    return params.reshape(-1,12), total
+
+def make_abd_from_parameters(parameters, thickness, material):
+    """Returns the (N,6,6) ABD matrices and (N,3) specific NT vectors given
+    (N,12) lamination parameters and (N,) total thicknesses.
+
+    No stack is needed, so any point in lamination parameter space can be
+    evaluated, feasible or not.
+    """
+    V = np.atleast_2d(np.asarray(parameters, dtype=float)).reshape(-1,3,4)
+    h = np.broadcast_to(np.asarray(thickness, dtype=float), V.shape[:1])
+    gamma = make_invariant_matrices(material)
+    thermal = make_thermal_vectors(material)
+
+    ABD = np.empty((V.shape[0],6,6))
+    ABD[:,0:3,0:3] = h[:,None,None] * (gamma[0] +
+                     np.einsum('ni,ijk->njk', V[:,0], gamma[1:]))
+    ABD[:,0:3,3:] = (h**2/4)[:,None,None] * \
+                    np.einsum('ni,ijk->njk', V[:,1], gamma[1:])
+    ABD[:,3:,0:3] = ABD[:,0:3,3:]
+    ABD[:,3:,3:] = (h**3/12)[:,None,None] * (gamma[0] +
+                   np.einsum('ni,ijk->njk', V[:,2], gamma[1:]))
+    specificNT = h[:,None] * (thermal[0] + np.einsum('ni,ij->nj',
+                 V[:,0,:2], thermal[1:]))
+    return ABD, specificNT
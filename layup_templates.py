@@ -0,0 +1,156 @@
+"""Closed-form stiffness of layups built from uniform blocks of plies.
+
+A template such as [a_m/-a_m/0_n/90_n/0_n/-a_m/a_m] is a short list of
+blocks, each holding some number of identical plies. The ply stiffness is
+constant through a block, so every block adds its Q-bar times the
+integral of 1, z or z^2 over its thickness. That makes A, B and D
+polynomials in the block counts and ply thicknesses. Evaluating a design
+costs O(blocks), however many plies it holds.
+
+Ply strength is another matter, as strains under bending grow through a
+block. The first and last plies of every block are therefore checked on
+their own, which is still O(blocks).
+
+Counts need not be integers. Continuous counts give the smooth
+relaxation that gradient based optimizers need.
+"""
+import numpy as np
+import batch_plates as bp
+import failure_criteria as fc
+import laminate_fundamentals as lf
+
+class LayupTemplate(object):
+    """A parameterized layup of uniform ply blocks.
+
+    blocks lists (orientation, count) or (orientation, count,
+    material_index) tuples from the tool side. Orientations are numbers in
+    degrees, or a parameter name optionally prefixed with '-'. Counts are
+    numbers or parameter names. symmetric mirrors the blocks about the
+    mid-plane, as Laminate does. materials is a list of Plate2D materials
+    whose Thickness is the ply thickness.
+    """
+
+    def __init__(self, blocks, materials, symmetric=False):
+        self.Blocks = [tuple(block) + (0,)*(3 - len(block)) \
+                       for block in blocks]
+        if symmetric:
+            self.Blocks = self.Blocks + self.Blocks[::-1]
+        self.Materials = list(materials)
+        self.MaterialTable = bp.make_material_table(self.Materials)
+        self.PlyThickness = np.array([float(matl.Thickness) \
+                                      for matl in self.Materials])
+        self.MaterialIndex = np.array([block[2] for block in self.Blocks],
+                                      dtype=np.intp)
+
+        names = set()
+        for orient, count, _ in self.Blocks:
+            if isinstance(orient, str):
+                names.add(orient.lstrip('-'))
+            if isinstance(count, str):
+                names.add(count)
+        self.Parameters = tuple(sorted(names))
+
+    def _make_value(self, item, params):
+        if not isinstance(item, str):
+            return float(item)
+        sign = -1.0 if item.startswith('-') else 1.0
+        try:
+            return sign * np.asarray(params[item.lstrip('-')], dtype=float)
+        except KeyError:
+            raise KeyError('Template parameter '+item.lstrip('-')+' not given')
+
+    def _make_arrays(self, params):
+        # (designs, blocks) orientations and counts, broadcast together
+        values = [self._make_value(orient, params) for orient, _, _ \
+                  in self.Blocks]
+        values += [self._make_value(count, params) for _, count, _ \
+                   in self.Blocks]
+        values = np.stack(np.broadcast_arrays(*values), axis=-1)
+        values = values.reshape(-1, 2, len(self.Blocks))
+        return values[:,0], values[:,1]
+
+    def make_counts(self, **params):
+        """Returns the (designs, blocks) ply counts, as floats."""
+        return self._make_arrays(params)[1]
+
+    def make_blocks(self, **params):
+        """Returns the padded (designs, blocks) orientations, thicknesses and
+        material_index arrays, treating every block as one thick ply. That
+        is exact for stiffness and weight, but not for ply strength.
+        """
+        orients, counts = self._make_arrays(params)
+        thicknesses = counts * self.PlyThickness[self.MaterialIndex]
+        material_index = np.broadcast_to(self.MaterialIndex, counts.shape)
+        return orients, thicknesses, material_index
+
+    def __call__(self, **params):
+        """Returns the padded (designs, 3 x blocks) orientations, thicknesses
+        and material_index arrays of the template for strength checks.
+
+        Each block is split into its first ply, its interior and its last
+        ply, so that failure_criteria.make_batch_reserve checks the end
+        plies at their own mid-surfaces. Failure criteria are convex in z,
+        so one of the end plies governs the block, and the interior layer
+        never does. Stiffness is unchanged by the split. Templates can be
+        passed straight to design_sweep.DesignSweep.
+        """
+        orients, counts = self._make_arrays(params)
+        ends = np.stack([np.minimum(counts, 1), np.maximum(counts - 2, 0),
+                         np.clip(counts - 1, 0, 1)], axis=-1)
+        thicknesses = ends * self.PlyThickness[self.MaterialIndex][:,None]
+        material_index = np.broadcast_to(np.repeat(self.MaterialIndex, 3),
+                                         (counts.shape[0], 3*counts.shape[1]))
+        return np.repeat(orients, 3, axis=1), \
+               thicknesses.reshape(counts.shape[0], -1), material_index
+
+    def make_stiffness(self, **params):
+        """Returns the (designs,6,6) ABD and (designs,3) specific NT of the
+        template for arrays of parameter values.
+        """
+        orients, thicknesses, material_index = self.make_blocks(**params)
+        return bp.make_batch_stiffness(orients, thicknesses, material_index,
+                                       self.MaterialTable)
+
+    def make_effective_properties(self, **params):
+        """Returns the batch_plates.make_effective_properties dictionary for
+        arrays of parameter values.
+        """
+        orients, thicknesses, material_index = self.make_blocks(**params)
+        ABD, NT = bp.make_batch_stiffness(orients, thicknesses,
+                                          material_index, self.MaterialTable)
+        return bp.make_effective_properties(ABD, thicknesses.sum(axis=1), NT)
+
+    def make_weight(self, **params):
+        """Returns the areal weight of each design."""
+        _, thicknesses, material_index = self.make_blocks(**params)
+        return np.einsum('np,np->n', thicknesses,
+                         self.MaterialTable['Density'][material_index])
+
+    def make_reserve(self, loads, criterion='hoffman', **params):
+        """Returns the failure_criteria.make_batch_reserve dictionary of the
+        designs under a (6,M) block of loads. Ply indices refer to the
+        layers of __call__.
+        """
+        ABD, _ = self.make_stiffness(**params)
+        orients, thicknesses, material_index = self(**params)
+        return fc.make_batch_reserve(orients, thicknesses, material_index,
+                                     self.Materials, loads, criterion, ABD)
+
+    def make_laminate(self, **params):
+        """Expands one design with integer counts into a PackedLaminate."""
+        counts = self.make_counts(**params)[0]
+        if not np.allclose(counts, np.round(counts)):
+            raise ValueError('Only integer ply counts can be expanded')
+        orients = self.make_blocks(**params)[0][0]
+        repeat = np.round(counts).astype(np.intp)
+        material_index = np.repeat(self.MaterialIndex, repeat)
+        return lf.PackedLaminate(np.repeat(orients, repeat),
+                                 self.PlyThickness[material_index],
+                                 material_index, self.Materials)
+
+def make_amn_template(material):
+    """Returns the [a_m/-a_m/0_n/90_n/0_n/-a_m/a_m] template of oldSauce,
+    with parameters a, m and n, used by laminate_optimizer and design_sweep.
+    """
+    return LayupTemplate([('a', 'm'), ('-a', 'm'), (0, 'n'), (90, 'n'),
+                          (0, 'n'), ('-a', 'm'), ('a', 'm')], [material])
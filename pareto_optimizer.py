@@ -0,0 +1,259 @@
+"""Multi-objective (weight, margin and stiffness) stacking optimization.
+
+ParetoStackingGA is an NSGA-II search over the same integer coded
+symmetric half stacks as stacking_ga. Objectives are:
+- the areal weight,
+- the governing first ply failure reserve factor,
+- any chosen effective stiffnesses from make_effective_properties.
+Weight is minimized and everything else maximized. Every generation is
+scored in a single batch.
+
+Non-dominated sorting is the divide and conquer of Jensen, as generalized
+by Fortin et al. to ties and duplicate points. It never compares all pairs.
+Two objectives take a single O(N log N) sweep over a staircase of the best
+rank seen so far. Each further objective splits the points at a median and
+adds a log N factor, O(N log^(M-1) N) in all. The cost is the same however
+the points fall into fronts.
+"""
+import bisect
+import numpy as np
+import batch_plates as bp
+import failure_criteria as fc
+import stacking_ga as sg
+
+def make_nondominated_ranks(objectives):
+    """Returns the front number (0 for the non-dominated front) of every row
+    of an (N,M) array of objectives to be minimized. Equal rows share a
+    front.
+    """
+    objectives = np.asarray(objectives, dtype=float)
+    nObj = objectives.shape[1]
+    # Unique rows in lexicographic order, so no row can dominate an earlier
+    points, inverse = np.unique(objectives, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    if nObj == 1:
+        return inverse.astype(np.intp)
+    sorter = _NondominatedSort(points)
+    sorter.sort_all(np.arange(points.shape[0]), nObj - 1)
+    return sorter.Rank[inverse]
+
+class _NondominatedSort(object):
+    # Jensen/Fortin divide and conquer over lexicographically sorted unique
+    # points. Index arrays always stay in that order. sort_all ranks a set
+    # whose objectives above k are all equal, and sort_from raises the
+    # ranks of high by those of low, where every low point is no worse
+    # than every high point in the objectives above k.
+    Brute = 256
+
+    def __init__(self, points):
+        self.Points = points
+        self.Rank = np.zeros(points.shape[0], dtype=np.intp)
+
+    def sort_all(self, index, k):
+        if index.size < 2:
+            return
+        if k == 1:
+            self._sweep(index[:0], index)
+            return
+        values = self.Points[index,k]
+        if values[0] == values.min() == values.max():
+            self.sort_all(index, k-1)
+            return
+        if index.size <= 16:
+            rank = self.Rank
+            for pos in range(1, index.size):
+                dominated = np.all(self.Points[index[:pos],:k+1] <=
+                                   self.Points[index[pos],:k+1], axis=1)
+                if dominated.any():
+                    rank[index[pos]] = max(rank[index[pos]],
+                                           rank[index[:pos]][dominated].max()+1)
+            return
+        # Ties with the median join the smaller side, so the halves never
+        # share a value of objective k
+        pivot = np.partition(values, values.size//2)[values.size//2]
+        less = values < pivot
+        greater = values > pivot
+        if less.sum() <= greater.sum():
+            less = ~greater
+        else:
+            greater = ~less
+        self.sort_all(index[less], k)
+        self.sort_from(index[less], index[greater], k-1)
+        self.sort_all(index[greater], k)
+
+    def sort_from(self, low, high, k):
+        if not low.size or not high.size:
+            return
+        if low.size * high.size <= self.Brute:
+            dominated = np.all(self.Points[low,None,:k+1] <=
+                               self.Points[None,high,:k+1], axis=-1)
+            gain = np.where(dominated, self.Rank[low,None] + 1, 0).max(axis=0)
+            self.Rank[high] = np.maximum(self.Rank[high], gain)
+            return
+        if k == 1:
+            self._sweep(low, high)
+            return
+        lowValues = self.Points[low,k]
+        highValues = self.Points[high,k]
+        if lowValues.max() <= highValues.min():
+            self.sort_from(low, high, k-1)
+        elif lowValues.min() <= highValues.max():
+            both = np.concatenate((lowValues, highValues))
+            pivot = np.partition(both, both.size//2)[both.size//2]
+            if pivot < both.max():
+                lowUpper = lowValues > pivot
+                highUpper = highValues > pivot
+            else:
+                lowUpper = lowValues >= pivot
+                highUpper = highValues >= pivot
+            self.sort_from(low[~lowUpper], high[~highUpper], k)
+            self.sort_from(low[~lowUpper], high[highUpper], k-1)
+            self.sort_from(low[lowUpper], high[highUpper], k)
+
+    def _sweep(self, low, high):
+        # Two objective sweep in lexicographic order. The staircase holds
+        # objective 1 values with strictly increasing ranks, so the best
+        # rank at or below a value is a bisection away. Low points are only
+        # inserted, high points are only ranked. sort_all passes every
+        # point as high and inserts each one once it is ranked.
+        insertLow = low.size > 0
+        index = np.concatenate((low, high))
+        isLow = np.r_[np.ones(low.size, dtype=bool),
+                      np.zeros(high.size, dtype=bool)]
+        order = np.argsort(index, kind='stable')
+        index = index[order].tolist()
+        isLow = isLow[order].tolist()
+        values = self.Points[index,1].tolist()
+        ranks = self.Rank[index].tolist()
+        keys = list()
+        best = list()
+        for pos in range(len(index)):
+            value = values[pos]
+            if not isLow[pos]:
+                top = bisect.bisect_right(keys, value)
+                if top:
+                    ranks[pos] = max(ranks[pos], best[top-1] + 1)
+                if insertLow:
+                    continue
+            rank = ranks[pos]
+            first = bisect.bisect_left(keys, value)
+            if first and best[first-1] >= rank:
+                continue
+            last = bisect.bisect_right(best, rank, lo=first)
+            keys[first:last] = [value]
+            best[first:last] = [rank]
+        high = np.asarray(index)[~np.asarray(isLow, dtype=bool)]
+        self.Rank[high] = np.asarray(ranks)[~np.asarray(isLow, dtype=bool)]
+
+def make_crowding_distance(objectives, rank):
+    """Returns the NSGA-II crowding distance of every solution within its
+    front. Boundary solutions of a front get an infinite distance.
+    """
+    objectives = np.asarray(objectives, dtype=float)
+    nSol, nObj = objectives.shape
+    distance = np.zeros(nSol)
+    for obj in range(nObj):
+        # Sort by front, then by this objective within the front
+        order = np.lexsort((objectives[:,obj], rank))
+        value = objectives[order, obj]
+        front = rank[order]
+        first = np.r_[True, front[1:] != front[:-1]]
+        last = np.r_[front[1:] != front[:-1], True]
+        group = np.cumsum(first) - 1
+        span = value[np.flatnonzero(last)][group] - \
+               value[np.flatnonzero(first)][group]
+        gap = np.full(nSol, np.inf)
+        inner = np.flatnonzero(~(first | last))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gap[inner] = (value[inner+1] - value[inner-1]) / span[inner]
+        distance[order] += np.where(np.isnan(gap), 0, gap)
+    return distance
+
+class ParetoStackingGA(sg.StackingSequenceGA):
+    """NSGA-II trade-off of weight, failure margin and stiffness.
+
+    stiffness lists the make_effective_properties keys to maximize ('Exx',
+    'Gxy', ...). Other arguments are as for StackingSequenceGA.
+    """
+
+    def __init__(self, material, loads, angles=(0, 45, -45, 90), max_plies=32,
+                 criterion='hoffman', stiffness=('Exx',), population=1000,
+                 crossover=0.8, mutation=0.1, seed=None):
+        sg.StackingSequenceGA.__init__(self, material, loads, angles,
+            max_plies, criterion, population, 0.0, crossover, mutation, seed)
+        self.StiffnessNames = tuple(stiffness)
+        self.ObjectiveNames = ('Weight', 'ReserveFactor') + \
+                              self.StiffnessNames
+
+    def make_objectives(self, half):
+        """Returns the (N, objectives) array to minimize for a population of
+        half stacks: weight, then the negated reserve factor and
+        stiffnesses. Empty stacks score infinity throughout.
+        """
+        codes = self.make_full_stack(half)
+        ABD, _ = self.Angles.make_batch_stiffness(codes)
+        count = (codes != self.Angles.PadCode).sum(axis=1)
+        objectives = np.full((codes.shape[0], len(self.ObjectiveNames)),
+                             np.inf)
+        real = count > 0
+        if real.any():
+            orientations = np.nan_to_num(self.Angles.decode(codes[real]))
+            thicknesses = self.Angles.make_thicknesses(codes[real])
+            reserve = fc.make_batch_reserve(orientations, thicknesses, 0,
+                      self.Angles.Materials, self.Loads, self.Criterion,
+                      ABD[real])['ReserveFactor'].min(axis=1)
+            properties = bp.make_effective_properties(ABD[real],
+                                                      thicknesses.sum(axis=1))
+            objectives[real,0] = count[real] * self.PlyWeight
+            objectives[real,1] = -reserve
+            for col, name in enumerate(self.StiffnessNames):
+                objectives[real,2+col] = -properties[name]
+        return objectives
+
+    def make_selection(self, objectives, n_keep):
+        """Returns the indices of the n_keep best solutions by front and
+        crowding distance, with the selection key and front number of every
+        solution.
+        """
+        rank = make_nondominated_ranks(objectives)
+        crowding = make_crowding_distance(objectives, rank)
+        # Front number first, then the most crowding distance. The key is
+        # the position in that order, so smaller is better.
+        order = np.lexsort((-crowding, rank))
+        key = np.empty(order.size)
+        key[order] = np.arange(order.size)
+        return order[:n_keep], key, rank
+
+    def run(self, generations=100, verbose=False):
+        """Evolves the population and returns the final non-dominated front.
+
+        The dictionary holds the distinct designs of the front: their half
+        stack Codes, the Objectives array (with reserve factor and
+        stiffnesses as positive values), and one array per objective name.
+        """
+        half = self.make_initial_population()
+        objectives = self.make_objectives(half)
+        _, key, _ = self.make_selection(objectives, len(half))
+        for gen in range(int(generations)):
+            children = self.make_offspring(half, key)
+            pool = np.concatenate((half, children))
+            poolObjectives = np.concatenate((objectives,
+                                             self.make_objectives(children)))
+            keep, poolKey, rank = self.make_selection(poolObjectives,
+                                                      len(half))
+            half, objectives, key = pool[keep], poolObjectives[keep], \
+                                    poolKey[keep]
+            if verbose:
+                print('gen {g}: {n} designs on the front'.format(g=gen,
+                      n=int((rank[keep] == 0).sum())))
+
+        front = (make_nondominated_ranks(objectives) == 0) & \
+                np.isfinite(objectives).all(axis=1)
+        codes, unique = np.unique(half[front], axis=0, return_index=True)
+        values = objectives[front][unique] * \
+                 np.r_[1, -np.ones(len(self.ObjectiveNames)-1)]
+        order = np.argsort(values[:,0], kind='stable')
+        dictOut = {'Codes':codes[order], 'Objectives':values[order]}
+        for col, name in enumerate(self.ObjectiveNames):
+            dictOut[name] = values[order,col]
+        return dictOut
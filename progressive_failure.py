@@ -0,0 +1,138 @@
+"""Progressive (last ply) failure of batches of thin laminates.
+
+Load is applied proportionally, R = l*R0, and ramped from one ply failure
+to the next. Every step solves all laminates of the batch together: the
+next failing ply of each laminate and its load factor come straight from
+failure_criteria.make_ply_reserve. The failed ply is then degraded according
+to its failure mode and only its contribution to A, B and D is replaced,
+so the laminate is never rebuilt.
+
+Matrix failures (matrix tension, compression or shear) knock down E22, G12
+and Nu12. Fibre failures, and a second failure of a matrix failed ply,
+knock down all properties. Degraded properties keep a small residual
+fraction so ABD stays invertible.
+"""
+import numpy as np
+import batch_plates as bp
+import failure_criteria as fc
+
+INTACT = 0
+MATRIX = 1
+FIBER = 2
+
+def make_degraded_stiffness(materials, residual=1e-6):
+    """Returns the (materials, 3 states, 3, 3) fibre coordinate stiffness of
+    every material when INTACT, MATRIX failed and FIBER failed.
+    """
+    stiffness = np.empty((len(materials),3,3,3))
+    for idx, matl in enumerate(materials):
+        for state, (k1, k2) in enumerate([(1,1), (1,residual),
+                                          (residual,residual)]):
+            E11 = matl.E11 * k1
+            E22 = matl.E22 * k2
+            Nu12 = matl.Nu12 * k2
+            G12 = matl.G12 * k2
+            compliance = np.array([[1/E11, -Nu12/E11, 0],
+                                   [-Nu12/E11, 1/E22, 0],
+                                   [0, 0, 1/G12]])
+            stiffness[idx,state] = np.linalg.inv(compliance)
+    return stiffness
+
+def make_progressive_failure(orientations, thicknesses, material_index,
+                             materials, loads, criterion='hoffman',
+                             residual=1e-6, max_events=None):
+    """Runs a progressive failure analysis of a batch of laminates.
+
+    Laminates are padded (laminates x plies) arrays as in batch_plates, and
+    loads is a 6 vector or one (laminates, 6) load direction per laminate.
+    Plies are checked at their mid-surface.
+
+    Returns a dictionary. LoadFactor, Ply and Mode are (laminates, events)
+    arrays of the load path, padded with NaN and -1, and Strains holds the
+    mid-plane strains and curvatures at each event. FirstPly and LastPly are
+    the first and last ply failure load factors of each laminate.
+    """
+    orientations = np.atleast_2d(np.asarray(orientations, dtype=float))
+    nLam, nPly = orientations.shape
+    thicknesses = np.broadcast_to(thicknesses, orientations.shape)
+    material_index = np.broadcast_to(np.asarray(material_index,
+                                     dtype=np.intp), orientations.shape)
+    loads = np.broadcast_to(np.asarray(loads, dtype=float).reshape(-1,6),
+                            (nLam,6))
+    if max_events is None:
+        max_events = 2*nPly
+
+    localStiffness = make_degraded_stiffness(materials, residual)
+    allowables = fc.make_allowables(materials, material_index)
+    T = bp.make_strain_transforms(orientations)
+    h = bp.make_z_weights(thicknesses)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        zMid = np.where(h[0] > 0, h[1]/h[0], 0)
+
+    # Padding plies count as already gone
+    state = np.where(thicknesses > 0, INTACT, FIBER)
+    Q = localStiffness[material_index, INTACT]
+    Qbar = np.einsum('npji,npjk,npkl->npil', T, Q, T)
+    ABD = np.empty((nLam,6,6))
+    ABD[:,0:3,0:3] = np.einsum('np,npij->nij', h[0], Qbar)
+    ABD[:,0:3,3:] = np.einsum('np,npij->nij', h[1], Qbar)
+    ABD[:,3:,0:3] = ABD[:,0:3,3:]
+    ABD[:,3:,3:] = np.einsum('np,npij->nij', h[2], Qbar)
+
+    loadFactor = np.full((nLam,max_events), np.nan)
+    failedPly = np.full((nLam,max_events), -1)
+    failedMode = np.full((nLam,max_events), -1)
+    strains = np.full((nLam,max_events,6), np.nan)
+    level = np.zeros(nLam)
+    active = np.ones(nLam, dtype=bool)
+
+    for event in range(max_events):
+        lam = np.flatnonzero(active)
+        if not lam.size:
+            break
+        # Unit load response of the current, degraded laminates
+        eps = np.linalg.solve(ABD[lam], loads[lam][...,None])[...,0]
+        globalStrain = eps[:,None,0:3] + zMid[lam][...,None]*eps[:,None,3:]
+        plyStrain = np.einsum('npij,npj->npi', T[lam], globalStrain)
+        plyStress = np.einsum('npij,npj->npi', Q[lam], plyStrain)
+        subset = dict((key, value[lam]) for key, value in allowables.items())
+        reserve, mode = fc.make_ply_reserve(plyStress, plyStrain, subset,
+                                            criterion)
+        reserve[state[lam] == FIBER] = np.inf
+
+        ply = np.argmin(reserve, axis=1)
+        rows = np.arange(lam.size)
+        nextLevel = reserve[rows, ply]
+        failing = np.isfinite(nextLevel)
+        active[lam[~failing]] = False
+        lam, ply, rows = lam[failing], ply[failing], rows[failing]
+        mode = mode[rows, ply]
+
+        # Cascading failures happen at the load already reached
+        level[lam] = np.maximum(level[lam], nextLevel[failing])
+        loadFactor[lam,event] = level[lam]
+        failedPly[lam,event] = ply
+        failedMode[lam,event] = mode
+        strains[lam,event] = level[lam][:,None] * eps[rows]
+
+        # Swap in the degraded ply, touching only its own ABD contribution
+        old = state[lam, ply]
+        new = np.where((mode <= 1) | (old == MATRIX), FIBER, MATRIX)
+        state[lam, ply] = new
+        Q[lam, ply] = localStiffness[material_index[lam, ply], new]
+        Tp = T[lam, ply]
+        newBar = np.einsum('nji,njk,nkl->nil', Tp, Q[lam, ply], Tp)
+        delta = newBar - Qbar[lam, ply]
+        Qbar[lam, ply] = newBar
+        weights = h[:, lam, ply]
+        ABD[lam,0:3,0:3] += weights[0][:,None,None] * delta
+        ABD[lam,0:3,3:] += weights[1][:,None,None] * delta
+        ABD[lam,3:,0:3] += weights[1][:,None,None] * delta
+        ABD[lam,3:,3:] += weights[2][:,None,None] * delta
+
+    return {'LoadFactor':loadFactor,
+            'Ply':failedPly,
+            'Mode':failedMode,
+            'Strains':strains,
+            'FirstPly':loadFactor[:,0],
+            'LastPly':np.fmax.reduce(loadFactor, axis=1)}
@@ -47,24 +47,28 @@ class Properties(object):
     Any property calculator should inherit this class.
 
     The main goal here is to check that its getting a Laminate type object and
-    not just a list of Ply objects as was done in the past. The constructor
+    not just a list of Ply objects as was done in the past. Either a Laminate
+    or a PackedLaminate is accepted, and the packed form is always kept in
+    Packed for analyses that work on the ply arrays. The constructor
     for this also handles total thickness and density. This also defines some
     functions that return useful properties of laminates.
     """
 
     def __init__(self, laminate_input):
-        assert isinstance(laminate_input,lf.Laminate), 'Input not a laminate'
+        assert isinstance(laminate_input,(lf.Laminate,lf.PackedLaminate)), \
+            'Input not a laminate'
         self.Laminate = laminate_input
-        self.TotalThickness = 0
-        self.TotalDensity = 0
-
-        for ply in self.Laminate.PlyStack:
-            self.TotalThickness += ply.Thickness
-            self.TotalDensity += ply.Material.Density
+        if isinstance(laminate_input, lf.PackedLaminate):
+            self.Packed = laminate_input
+        else:
+            self.Packed = laminate_input.pack()
+        self.TotalThickness = float(self.Packed.Thicknesses.sum())
+        self.TotalDensity = float(self.Packed.make_densities().sum())
 
         self.TotalArealDensity = self.TotalDensity * self.TotalThickness
 
-        _ = self.make_global_compliance()
+        # Compliance is left for callers that need it, as it may be an
+        # explicit inverse of the stiffness.
         _ = self.make_global_stiffness()
 
     def make_global_compliance(self):
@@ -128,7 +132,8 @@ class Properties(object):
         fiber directions, returning arrays of ply stresses and strains.
 
         Sadly this will be different for each type of analysis. The results
-        should be stored within each ply.
+        should be stored as arrays on the analysis, not within each ply, as
+        plies may be shared between positions in the stack.
         """
         raise NotImplementedError
 
@@ -149,9 +154,12 @@ class Properties(object):
         np.set_printoptions(precision=3, linewidth=256, suppress=False)
         output = "== "+self.__class__.__name__+" Properties ==\n"
         keyList = sorted(self.__dict__.keys())
-        # Remove keys that aren't useful to report in result string
-        while 'specificNT' in keyList: keyList.remove('specificNT')
-        while 'laminate' in keyList: keyList.remove('laminate')
+        # Remove keys that aren't useful to report in result string, along
+        # with the cached factorizations and lookup tables of the analysis
+        hidden = ('specificNT', 'laminate', 'Packed', 'MaterialTable',
+                  'PlyStiffness', 'PlyCTE', 'Factorization', 'PlyTransforms',
+                  'FailureForms', 'Allowables')
+        keyList = [key for key in keyList if key not in hidden]
         # Build the result string
         for key in keyList:
             output += (key+" = "+str(self.__dict__[key])+"\n")
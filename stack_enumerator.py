@@ -0,0 +1,160 @@
+"""Exhaustive enumeration of stacking sequences over an angle alphabet.
+
+Stacks are built from both surfaces inwards, one pair of plies (first and
+last) at a time. This lets the three pruning rules cut whole subtrees:
+
+- symmetric stacks force every pair to match, so only half stacks branch,
+- balance prunes any prefix whose +/- angle imbalance is larger than the
+  plies left to fix it,
+- a stack and its reversal (the same laminate turned over) are the same
+  design. Only the canonical form is kept, the lexicographically smaller
+  of the two. That is decided by the first unmatched pair, so a prefix
+  whose first unmatched pair is descending is dropped at once.
+
+The search is depth first over batches of prefixes. Finished stacks are
+handed out as fixed size arrays of DiscreteAngles codes, so memory is set
+by the chunk size and not by the size of the design space.
+"""
+import numpy as np
+import discrete_angles as da
+import failure_criteria as fc
+import stacking_rules as sr
+
+class StackEnumerator(object):
+    """Enumerates every distinct n_plies stack of a DiscreteAngles alphabet.
+
+    symmetric keeps only stacks symmetric about the mid-plane and balanced
+    only those with as many -theta as +theta plies. Angles other than 0
+    and 90 whose negative is not in the alphabet cannot be balanced.
+    """
+
+    def __init__(self, angles, n_plies, symmetric=True, balanced=True):
+        assert isinstance(angles, da.DiscreteAngles), \
+            'Angles must be a DiscreteAngles table'
+        self.Angles = angles
+        self.Plies = int(n_plies)
+        self.Symmetric = symmetric
+        self.Balanced = balanced
+
+        # Signed membership of each code in each +/- balance pair
+        self.BalanceSign = sr.make_balance_signs(angles)
+
+    def _make_moves(self):
+        # (moves, 2) codes of the next (first, last) ply pair
+        n = self.Angles.PadCode
+        if self.Symmetric:
+            return np.repeat(np.arange(n), 2).reshape(-1,2)
+        first, last = np.meshgrid(np.arange(n), np.arange(n), indexing='ij')
+        return np.stack([first.ravel(), last.ravel()], axis=-1)
+
+    def make_chunks(self, chunk=65536):
+        """Yields (stacks, n_plies) uint8 code arrays of at most chunk
+        stacks until every distinct stack has been produced once.
+        """
+        nPair = self.Plies // 2
+        middle = self.Plies % 2
+        moves = self._make_moves()
+        nMove = moves.shape[0]
+        out = list()
+        size = 0
+
+        # Prefix batches: outer pairs, tied (still a palindrome), imbalance
+        stack = [(np.zeros((1,0,2), dtype=np.uint8), np.ones(1, dtype=bool),
+                  np.zeros((1,self.BalanceSign.shape[1]), dtype=int))]
+        while stack:
+            pairs, tied, imbalance = stack.pop()
+            depth = pairs.shape[1]
+            if depth == nPair:
+                if middle:
+                    pairs, tied, imbalance, centre = self._add_middle(pairs,
+                                                     tied, imbalance)
+                else:
+                    centre = np.zeros((pairs.shape[0],0), dtype=np.uint8)
+                if self.Balanced:
+                    keep = ~np.any(imbalance, axis=1)
+                    pairs, centre = pairs[keep], centre[keep]
+                stacks = np.concatenate((pairs[:,:,0], centre,
+                                         pairs[:,::-1,1]), axis=1)
+                out.append(stacks)
+                size += stacks.shape[0]
+                while size >= chunk:
+                    block = np.concatenate(out)
+                    yield block[:chunk]
+                    out = [block[chunk:]]
+                    size -= chunk
+                continue
+
+            nPrefix = pairs.shape[0]
+            move = np.tile(moves, (nPrefix,1))
+            pairs = np.concatenate((np.repeat(pairs, nMove, axis=0),
+                                    move[:,None,:].astype(np.uint8)), axis=1)
+            keep = ~(np.repeat(tied, nMove) & (move[:,0] > move[:,1]))
+            tied = np.repeat(tied, nMove) & (move[:,0] == move[:,1])
+            imbalance = np.repeat(imbalance, nMove, axis=0) + \
+                        self.BalanceSign[move[:,0]] + self.BalanceSign[move[:,1]]
+            if self.Balanced:
+                left = self.Plies - 2*(depth + 1)
+                keep &= np.abs(imbalance).sum(axis=1) <= left
+            pairs, tied, imbalance = pairs[keep], tied[keep], imbalance[keep]
+
+            # Depth first, in batches of about chunk prefixes
+            for part in np.array_split(np.arange(pairs.shape[0]),
+                        max(1, int(np.ceil(pairs.shape[0]/float(chunk)))))[::-1]:
+                if part.size:
+                    stack.append((pairs[part], tied[part], imbalance[part]))
+
+        if size:
+            yield np.concatenate(out)
+
+    def _add_middle(self, pairs, tied, imbalance):
+        # Odd stacks get a single middle ply of every angle
+        n = self.Angles.PadCode
+        centre = np.tile(np.arange(n, dtype=np.uint8), pairs.shape[0])
+        imbalance = np.repeat(imbalance, n, axis=0) + self.BalanceSign[centre]
+        return np.repeat(pairs, n, axis=0), np.repeat(tied, n), imbalance, \
+               centre[:,None]
+
+    def make_evaluations(self, loads, criterion='hoffman', chunk=65536,
+                         material_index=0, rules=None):
+        """Yields a dictionary for each chunk of stacks with their Codes,
+        ABD, areal Weight and (stacks, load cases) first ply failure
+        ReserveFactor.
+
+        rules is an optional stacking_rules.StackingRules. Stacks breaking
+        any of its rules are dropped before they are evaluated.
+        """
+        table = self.Angles
+        density = np.array([float(matl.Density) for matl in table.Materials])
+        for codes in self.make_chunks(chunk):
+            if rules is not None:
+                codes = rules.filter(codes)
+                if not codes.shape[0]:
+                    continue
+            ABD, _ = table.make_batch_stiffness(codes, material_index)
+            thicknesses = table.make_thicknesses(codes, material_index)
+            reserve = fc.make_batch_reserve(table.decode(codes), thicknesses,
+                      material_index, table.Materials, loads, criterion, ABD)
+            yield {'Codes':codes,
+                   'ABD':ABD,
+                   'Weight':thicknesses.sum(axis=1) * density[material_index],
+                   'ReserveFactor':reserve['ReserveFactor']}
+
+    def make_best(self, loads, n_best=10, criterion='hoffman', chunk=65536,
+                  material_index=0, rules=None):
+        """Returns the n_best stacks with the largest governing reserve
+        factor over all load cases, best first, keeping only n_best stacks
+        between chunks. The dictionary holds their Codes and ReserveFactor,
+        and the Count of stacks evaluated (after any rules filter).
+        """
+        codes = np.zeros((0, self.Plies), dtype=np.uint8)
+        reserve = np.zeros(0)
+        count = 0
+        for result in self.make_evaluations(loads, criterion, chunk,
+                                            material_index, rules):
+            count += result['Codes'].shape[0]
+            codes = np.concatenate((codes, result['Codes']))
+            reserve = np.concatenate((reserve,
+                                      result['ReserveFactor'].min(axis=1)))
+            order = np.argsort(-reserve, kind='stable')[:n_best]
+            codes, reserve = codes[order], reserve[order]
+        return {'Codes':codes, 'ReserveFactor':reserve, 'Count':count}
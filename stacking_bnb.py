@@ -0,0 +1,343 @@
+"""Exact branch and bound search for symmetric stacking sequences.
+
+The half stack is built ply by ply from the outer surface towards the
+mid-plane, so every node fixes the outer plies and leaves an inner core of
+known thickness. The core's A and D contributions lie in the convex hull of
+the angle set's Q-bar matrices, scaled by the core's integration weights.
+The matrix-valued bounds on that hull give:
+
+- an upper bound on every A and D stiffness term, each being linear in the
+  core lamination parameters,
+- Loewner bounds on A^-1 and D^-1. These hold the mid-plane strains and
+  curvatures of every completion in a ball about the interval centre.
+
+Every failure criterion, written as 1/reserve factor, is Lipschitz in the
+global ply strain. The strain balls therefore give an upper bound on the
+reserve factor of each fixed ply, and hence on the first ply failure
+reserve factor of any completion. Subtrees whose bound cannot beat the
+incumbent are pruned. At a leaf the balls collapse to points and the bound
+is the exact reserve factor at the ply mid-surfaces, as in
+ThinPlates.make_reserve_factors. Nodes are expanded in batches, with the
+best bounded children searched first.
+"""
+import time
+import warnings
+import numpy as np
+import batch_plates as bp
+import failure_criteria as fc
+
+_COMPONENTS = {'1':0, '2':1, '6':2}
+
+class StackingBranchAndBound(object):
+    """Finds the symmetric n_plies stack of one material with the largest
+    first ply failure reserve factor over all load cases.
+
+    loads is a 6 vector or a (6,M) block of resultants. stiffness optionally
+    maps A and D terms ('A11', 'D66', ...) to required minimum values, and
+    stacks that miss any of them are infeasible.
+    """
+
+    def __init__(self, material, loads, n_plies, angles=(0, 45, -45, 90),
+                 criterion='hoffman', stiffness=None):
+        if criterion not in fc.CRITERIA:
+            raise KeyError('Unknown failure criterion '+str(criterion))
+        assert int(n_plies) % 2 == 0 and n_plies > 0, \
+            'Symmetric stacks need an even ply count'
+        self.Material = material
+        self.Loads = np.asarray(loads, dtype=float).reshape(6,-1)
+        self.Angles = np.asarray(angles, dtype=float)
+        self.HalfPlies = int(n_plies) // 2
+        self.Criterion = criterion
+        self.Allowables = fc.make_allowables([material], 0)
+
+        table = bp.make_material_table([material])
+        self.QBar, _ = bp.make_ply_stiffness(self.Angles,
+                       np.zeros(len(self.Angles), dtype=np.intp), table)
+        self.StrainMap = bp.make_strain_transforms(self.Angles)
+        self.StressMap = np.matmul(np.asarray(material.make_stiffness()),
+                                   self.StrainMap)
+        eig = np.linalg.eigvalsh(self.QBar)
+        self.qMin = eig.min()
+        self.qMax = eig.max()
+        self.Lipschitz = self.make_lipschitz()
+
+        # Half stack plies from the outer surface in, mirrored plies included
+        t = float(material.Thickness)
+        self.PlyThickness = t
+        zTop = t * (self.HalfPlies - np.arange(self.HalfPlies))
+        self.zMid = zTop - t/2
+        self.WeightA = 2*t
+        self.WeightD = 2*(zTop**3 - (zTop - t)**3)/3
+
+        self.Stiffness = list()
+        for name, value in (stiffness or {}).items():
+            if name[0] not in 'AD' or len(name) != 3:
+                raise KeyError('Unknown stiffness term '+str(name))
+            i, j = _COMPONENTS[name[1]], _COMPONENTS[name[2]]
+            self.Stiffness.append((name[0], i, j, float(value)))
+
+    def make_lipschitz(self):
+        """Returns, for every angle, a Lipschitz constant of 1/reserve factor
+        with respect to the global ply strain (Euclidean norm).
+        """
+        al = self.Allowables
+        crit = self.Criterion
+        M = self.StrainMap if crit == 'maxstrain' else self.StressMap
+        if crit in ('maxstress', 'maxstrain'):
+            names = ('Ep1t', 'Ep1c', 'Ep2t', 'Ep2c', 'Ep12s') \
+                    if crit == 'maxstrain' else \
+                    ('F1t', 'F1c', 'F2t', 'F2c', 'F12s')
+            limit = np.array([min(al[names[0]], al[names[1]]),
+                              min(al[names[2]], al[names[3]]), al[names[4]]])
+            return (np.linalg.norm(M, axis=-1) / limit).max(axis=-1)
+
+        if crit == 'tsaihill':
+            constant = np.zeros(len(self.Angles))
+            for f1 in (al['F1t'], al['F1c']):
+                for f2 in (al['F2t'], al['F2c']):
+                    H = np.array([[1/f1**2, -1/(2*f1**2), 0],
+                                  [-1/(2*f1**2), 1/f2**2, 0],
+                                  [0, 0, 1/al['F12s']**2]])
+                    self._check_convex(H)
+                    HM = np.einsum('kia,ij,kjb->kab', M, H, M)
+                    constant = np.maximum(constant,
+                               np.sqrt(np.linalg.eigvalsh(HM)[:,-1]))
+            return constant
+
+        F1, F2, F11, F22, F66, F12 = fc._make_strength_tensors(al, crit)
+        H = np.array([[F11, F12, 0], [F12, F22, 0], [0, 0, F66]], dtype=float)
+        self._check_convex(H)
+        F = np.array([F1, F2, 0], dtype=float)
+        # 1/reserve = (F.s + |K s|)/2 with K'K = FF' + 4H
+        KM = np.einsum('kia,ij,kjb->kab', M, np.outer(F, F) + 4*H, M)
+        linear = np.linalg.norm(np.einsum('kia,i->ka', M, F), axis=-1)
+        return (linear + np.sqrt(np.linalg.eigvalsh(KM)[:,-1])) / 2
+
+    def _check_convex(self, H):
+        if np.linalg.eigvalsh(H)[0] < 0:
+            raise ValueError('Criterion '+self.Criterion+' is not convex '
+                             'for the allowables of '+str(self.Material.Name))
+
+    def _make_interval(self, fixed, weight):
+        # Centre and radius of the inverses of fixed + weight*conv(QBar)
+        eye = np.eye(3)
+        low = np.linalg.inv(fixed + weight*self.qMax*eye)
+        up = np.linalg.inv(fixed + weight*self.qMin*eye)
+        return (low + up)/2, np.linalg.eigvalsh((up - low)/2)[:,-1]
+
+    def make_compositions(self, n):
+        """Returns every (count per angle) split of n plies, one per row."""
+        try:
+            return self.Compositions[n]
+        except AttributeError:
+            self.Compositions = dict()
+        except KeyError:
+            pass
+        rows = [()]
+        for k in range(len(self.Angles) - 1):
+            rows = [row + (c,) for row in rows
+                    for c in range(n - sum(row) + 1)]
+        counts = np.array([row + (n - sum(row),) for row in rows],
+                          dtype=float).reshape(-1, len(self.Angles))
+        self.Compositions[n] = counts
+        return counts
+
+    def _make_slack_bound(self, codes, strain, radius):
+        # Reserve factor bound of plies whose global strain lies within
+        # radius of strain
+        # Only maxstrain works on strains, the others on stresses
+        plyMap = self.StrainMap if self.Criterion == 'maxstrain' \
+                 else self.StressMap
+        ply = np.matmul(plyMap[codes], strain[...,None])[...,0]
+        if self.Criterion in ('hoffman', 'tsaiwu'):
+            # Skips the failure modes, which are not needed here
+            reserve = fc._smallest_root(*fc._make_quadratic_parts(ply,
+                                        self.Allowables, self.Criterion))
+        else:
+            reserve, _ = fc.make_ply_reserve(ply, ply, self.Allowables,
+                                             self.Criterion)
+        with np.errstate(divide='ignore'):
+            slack = 1/reserve - self.Lipschitz[codes]*radius
+            return np.where(slack > 0, 1/slack, np.inf)
+
+    def make_bounds(self, codes, A, D):
+        """Bounds a batch of nodes sharing the same depth.
+
+        codes holds the (nodes, fixed plies) angle codes from the outer
+        surface in, with A and D the fixed plies' contributions. Returns the
+        reserve factor upper bound of each node, or -inf where no completion
+        meets the stiffness requirements.
+
+        A depends only on how many core plies take each angle, so it is
+        exact for every such composition and only D is relaxed. Core plies
+        are bounded too, anywhere within the core.
+        """
+        depth = codes.shape[1]
+        nCore = self.HalfPlies - depth
+        core = self.PlyThickness * nCore
+        weightD = 2*core**3/3
+        counts = self.make_compositions(nCore)
+        fullA = A[:,None] + self.WeightA * \
+                np.einsum('ck,kij->cij', counts, self.QBar)
+
+        # (nodes, compositions) stiffness feasibility
+        feasible = np.ones(fullA.shape[:2], dtype=bool)
+        for block, i, j, value in self.Stiffness:
+            if block == 'A':
+                feasible &= fullA[...,i,j] >= value
+            else:
+                best = D[:,i,j] + weightD*self.QBar[:,i,j].max()
+                feasible &= (best >= value)[:,None]
+
+        N = self.Loads[0:3]
+        M = self.Loads[3:]
+        eps = np.einsum('bcij,jm->bcmi', np.linalg.inv(fullA), N)
+        centreD, radiusD = self._make_interval(D, weightD)
+        kappa = np.einsum('bij,jm->bmi', centreD, M)
+        rhoD = radiusD[:,None] * np.linalg.norm(M, axis=0)
+
+        # Fixed plies, (nodes, compositions, cases, plies, sides)
+        z = self.zMid[:depth,None] * np.array([1, -1])
+        strain = eps[:,:,:,None,None,:] + \
+                 z[...,None]*kappa[:,None,:,None,None,:]
+        bound = self._make_slack_bound(codes[:,None,None,:,None], strain,
+                np.abs(z)*rhoD[:,None,:,None,None])
+        bound = bound.reshape(bound.shape[:2] + (-1,)).min(axis=-1)
+
+        # Core plies of every angle present, (nodes, compositions, cases, angles)
+        if nCore:
+            angle = np.arange(len(self.Angles))
+            radius = core*(np.linalg.norm(kappa, axis=-1) + rhoD)
+            coreBound = self._make_slack_bound(angle,
+                        eps[:,:,:,None,:], radius[:,None,:,None])
+            coreBound = np.where(counts[None,:,None,:] > 0, coreBound, np.inf)
+            bound = np.minimum(bound, coreBound.min(axis=(2,3)))
+
+        bound = np.where(feasible, bound, -np.inf)
+        return bound.max(axis=1)
+
+    def _check_live(self, bound, best, target):
+        # Nodes that may still beat the incumbent, or reach the target
+        if target is None:
+            return bound > best
+        return bound >= target
+
+    def run(self, max_nodes=None, target=None, batch=64, verbose=False):
+        """Runs the search and returns a dictionary of the result.
+
+        The search stops after max_nodes evaluated nodes, or as soon as a
+        stack reaches the target reserve factor when one is given. Without a
+        node limit and target the result is proven optimal.
+
+        Orientations is the full stack of the best design, Codes its half
+        stack from the outer surface in. Bound is the best reserve factor
+        any stack could still reach and Gap its relative distance from the
+        incumbent ReserveFactor. Nodes, Time and NodesPerSecond describe the
+        search effort.
+        """
+        start = time.time()
+        nAngle = len(self.Angles)
+        best = -1.0
+        bestCodes = None
+        nodes = 0
+        stopped = False
+        stack = [(np.zeros((1,0), dtype=np.intp), np.zeros((1,3,3)),
+                  np.zeros((1,3,3)), np.array([np.inf]))]
+
+        while stack:
+            if (max_nodes is not None and nodes >= max_nodes) or \
+               (target is not None and best >= target):
+                stopped = True
+                break
+            codes, A, D, bound = stack.pop()
+            live = self._check_live(bound, best, target)
+            if not live.any():
+                continue
+            codes, A, D, bound = codes[live], A[live], D[live], bound[live]
+
+            # Every child of the batch appends one ply of each angle
+            depth = codes.shape[1]
+            new = np.tile(np.arange(nAngle), codes.shape[0])
+            codes = np.concatenate((np.repeat(codes, nAngle, axis=0),
+                                    new[:,None]), axis=1)
+            A = np.repeat(A, nAngle, axis=0) + self.WeightA*self.QBar[new]
+            D = np.repeat(D, nAngle, axis=0) + \
+                self.WeightD[depth]*self.QBar[new]
+            nodes += codes.shape[0]
+            # Bound in slices of about a million strain states
+            states = len(self.make_compositions(self.HalfPlies - depth - 1))
+            states *= 2 * self.Loads.shape[1] * (depth + 1 + nAngle)
+            size = max(1, 1000000 // states)
+            childBound = np.concatenate([self.make_bounds(codes[k:k+size],
+                         A[k:k+size], D[k:k+size]) \
+                         for k in range(0, codes.shape[0], size)])
+            childBound = np.minimum(childBound, np.repeat(bound, nAngle))
+            keep = self._check_live(childBound, best, target)
+            if not keep.any():
+                continue
+
+            if depth + 1 == self.HalfPlies:
+                leaf = np.flatnonzero(keep)[np.argmax(childBound[keep])]
+                if childBound[leaf] > best:
+                    best = childBound[leaf]
+                    bestCodes = codes[leaf]
+                    if verbose:
+                        print('{n} nodes: reserve factor {r:.5g}'.format(
+                              n=nodes, r=best))
+                continue
+
+            # Push the best bounded children last so they are searched first
+            order = np.flatnonzero(keep)[np.argsort(childBound[keep])]
+            for chunk in np.array_split(order,
+                                        int(np.ceil(order.size/batch))):
+                stack.append((codes[chunk], A[chunk], D[chunk],
+                              childBound[chunk]))
+
+        elapsed = time.time() - start
+        pending = [b.max() for _, _, _, b in stack if b.size]
+        upper = max([best] + pending) if stopped else max(best, 0.0)
+        found = bestCodes is not None
+        if found:
+            half = self.Angles[bestCodes]
+            orientations = np.concatenate((half, half[::-1]))
+        else:
+            half = orientations = np.array([])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gap = (upper - best)/best if found else np.inf
+        return {'Codes':bestCodes,
+                'Orientations':orientations,
+                'ReserveFactor':best if found else np.nan,
+                'Bound':upper,
+                'Gap':gap,
+                'Optimal':not stopped,
+                'Nodes':nodes,
+                'Time':elapsed,
+                'NodesPerSecond':nodes/elapsed if elapsed > 0 else np.inf}
+
+def make_lightest_stack(material, loads, max_plies, angles=(0, 45, -45, 90),
+                        criterion='hoffman', stiffness=None, max_nodes=None,
+                        verbose=False):
+    """Returns the StackingBranchAndBound result of the fewest plies that
+    carry every load case (reserve factor of at least one), or None.
+
+    Ply counts are searched upwards. Smaller counts are only proven
+    infeasible if their searches were not cut short by max_nodes, which is
+    reported by the Proven entry of the result.
+    """
+    proven = True
+    for n_plies in range(2, int(max_plies)+1, 2):
+        search = StackingBranchAndBound(material, loads, n_plies, angles,
+                                        criterion, stiffness)
+        result = search.run(max_nodes=max_nodes, target=1.0)
+        if verbose:
+            print('{p} plies: {n} nodes, {s:.3g} nodes/s'.format(p=n_plies,
+                  n=result['Nodes'], s=result['NodesPerSecond']))
+        if result['ReserveFactor'] >= 1:
+            result['Plies'] = n_plies
+            result['Proven'] = proven
+            return result
+        if not result['Optimal']:
+            warnings.warn('Search of '+str(n_plies)+' plies stopped at the '
+                          'node limit, lighter stacks may exist')
+            proven = False
+    return None
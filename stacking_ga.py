@@ -0,0 +1,191 @@
+"""Genetic algorithm for discrete stacking sequences of thin laminates.
+
+Candidates are symmetric laminates of one material, stored as the integer
+angle codes of their half stack (see discrete_angles). Padding codes mark
+dropped plies, so the ply count evolves along with the sequence. Every
+generation is scored in one batch: ABD from the DiscreteAngles tables and
+first ply failure from failure_criteria.make_batch_reserve.
+
+The objective is the lightest laminate whose first ply failure reserve
+factor is at least one for all load cases. Infeasible candidates are
+penalized by their shortfall.
+"""
+import numpy as np
+import discrete_angles as da
+import failure_criteria as fc
+
+class StackingSequenceGA(object):
+    """Stacking sequence optimizer over an angle alphabet.
+
+    loads is a 6 vector or a (6,M) block of resultants, all of which must be
+    carried. max_plies is the largest full (symmetric) ply count allowed.
+    """
+
+    def __init__(self, material, loads, angles=(0, 45, -45, 90), max_plies=32,
+                 criterion='hoffman', population=1000, elite=0.02,
+                 crossover=0.8, mutation=0.1, seed=None):
+        self.Material = material
+        self.Loads = np.asarray(loads, dtype=float).reshape(6,-1)
+        self.Angles = da.DiscreteAngles(angles, [material])
+        self.HalfPlies = int(max_plies) // 2
+        assert self.HalfPlies >= 2, 'Need at least 4 plies to optimize'
+        self.Criterion = criterion
+        self.PopulationSize = int(population)
+        self.Elite = max(int(elite * self.PopulationSize), 1)
+        self.Crossover = crossover
+        self.Mutation = mutation
+        self.Random = np.random.default_rng(seed)
+
+        # Weight of the fullest stack, used to scale the penalty
+        self.PlyWeight = float(material.Thickness) * float(material.Density)
+        self.Penalty = 2 * self.HalfPlies * self.PlyWeight
+
+    def make_full_stack(self, half):
+        """Mirrors (N, half plies) codes into full symmetric stacks."""
+        return np.concatenate((half, half[:,::-1]), axis=1)
+
+    def make_fitness(self, half):
+        """Scores a population of half stacks in one batch.
+
+        Returns the fitness (lower is better), areal weight and governing
+        reserve factor arrays.
+        """
+        codes = self.make_full_stack(half)
+        ABD, _ = self.Angles.make_batch_stiffness(codes)
+        weight = (codes != self.Angles.PadCode).sum(axis=1) * self.PlyWeight
+        reserve = np.zeros(codes.shape[0])
+        real = weight > 0
+        if real.any():
+            orientations = np.nan_to_num(self.Angles.decode(codes[real]))
+            result = fc.make_batch_reserve(orientations,
+                     self.Angles.make_thicknesses(codes[real]), 0,
+                     self.Angles.Materials, self.Loads, self.Criterion,
+                     ABD[real])
+            reserve[real] = result['ReserveFactor'].min(axis=1)
+        fitness = weight + self.Penalty * np.maximum(1 - reserve, 0)
+        return fitness, weight, reserve
+
+    def make_initial_population(self):
+        """Returns random half stacks with random ply counts."""
+        nAngle = self.Angles.PadCode
+        half = self.Random.integers(0, nAngle,
+                                    (self.PopulationSize, self.HalfPlies))
+        keep = self.Random.integers(1, self.HalfPlies+1, self.PopulationSize)
+        half[np.arange(self.HalfPlies) >= keep[:,None]] = self.Angles.PadCode
+        return half.astype(np.uint8)
+
+    def make_parents(self, fitness, n_child):
+        """Returns the (2, n_child) mother and father indices picked by
+        binary tournaments on fitness.
+        """
+        nPop = fitness.shape[0]
+        a = self.Random.integers(0, nPop, (2, n_child))
+        b = self.Random.integers(0, nPop, (2, n_child))
+        return np.where(fitness[a] <= fitness[b], a, b)
+
+    def make_crossover(self, n_child, n_half):
+        """Returns the (n_child, n_half) mask of the genes each child takes
+        from its father under one point crossover.
+        """
+        cut = self.Random.integers(1, n_half, n_child)
+        cross = self.Random.random(n_child) < self.Crossover
+        return (np.arange(n_half) >= cut[:,None]) & cross[:,None]
+
+    def mutate_angles(self, child):
+        """Gives a random ply of some children a new angle, in place.
+        Dropped plies stay dropped.
+        """
+        rng = self.Random
+        rows = np.arange(child.shape[0])
+        pick = rng.random(rows.size) < self.Mutation
+        pos = rng.integers(0, child.shape[1], rows.size)
+        pick &= child[rows, pos] != self.Angles.PadCode
+        child[rows[pick], pos[pick]] = rng.integers(0, self.Angles.PadCode,
+                                                    pick.sum())
+
+    def mutate_swaps(self, child):
+        """Swaps two random plies of some children, in place."""
+        rng = self.Random
+        rows = np.arange(child.shape[0])
+        pick = rng.random(rows.size) < self.Mutation
+        i = rng.integers(0, child.shape[1], rows.size)
+        j = rng.integers(0, child.shape[1], rows.size)
+        swapped = child[rows, i].copy()
+        child[rows[pick], i[pick]] = child[rows[pick], j[pick]]
+        child[rows[pick], j[pick]] = swapped[pick]
+
+    def make_offspring(self, half, fitness):
+        """Breeds the next generation by tournament selection, one point
+        crossover and the angle, swap, permutation and add/drop operators.
+        """
+        rng = self.Random
+        nPop, nHalf = half.shape
+        nChild = nPop - self.Elite
+
+        parents = self.make_parents(fitness, nChild)
+        fromFather = self.make_crossover(nChild, nHalf)
+        child = np.where(fromFather, half[parents[1]], half[parents[0]])
+        rows = np.arange(nChild)
+        self.mutate_angles(child)
+        self.mutate_swaps(child)
+
+        # Permute a random block of plies
+        pick = np.flatnonzero(rng.random(nChild) < self.Mutation)
+        if pick.size:
+            length = rng.integers(2, nHalf+1, pick.size)
+            start = rng.integers(0, nHalf - length + 1)
+            offset = np.arange(nHalf)
+            inside = (offset >= start[:,None]) & \
+                     (offset < (start + length)[:,None])
+            # Random sort keys inside the block, fixed keys outside it
+            keys = np.where(inside, start[:,None] + length[:,None] * \
+                            rng.random((pick.size, nHalf)), offset)
+            child[pick] = np.take_along_axis(child[pick],
+                                             np.argsort(keys, axis=1), axis=1)
+
+        # Add or drop a ply
+        pick = rng.random(nChild) < self.Mutation
+        pos = rng.integers(0, nHalf, nChild)
+        pad = child[rows, pos] == self.Angles.PadCode
+        add = pick & pad
+        drop = pick & ~pad
+        child[rows[add], pos[add]] = rng.integers(0, self.Angles.PadCode,
+                                                  add.sum())
+        child[rows[drop], pos[drop]] = self.Angles.PadCode
+
+        elite = half[np.argsort(fitness)[:self.Elite]]
+        return np.concatenate((elite, child)).astype(np.uint8)
+
+    def print_generation(self, gen, weight, reserve):
+        """Prints the progress line of a generation's best design."""
+        print('gen {g}: weight={w:.5g} reserve={r:.4g}'.format(
+              g=gen, w=weight, r=reserve))
+
+    def run(self, generations=100, verbose=False):
+        """Evolves the population and returns a dictionary of the best
+        design found.
+
+        Orientations is the full stack of the best design with dropped plies
+        removed, Codes its half stack codes, and History the best fitness
+        of every generation.
+        """
+        half = self.make_initial_population()
+        fitness, weight, reserve = self.make_fitness(half)
+        history = list()
+        for gen in range(int(generations)):
+            half = self.make_offspring(half, fitness)
+            fitness, weight, reserve = self.make_fitness(half)
+            best = np.argmin(fitness)
+            history.append(fitness[best])
+            if verbose:
+                self.print_generation(gen, weight[best], reserve[best])
+
+        best = np.argmin(fitness)
+        codes = self.make_full_stack(half[best:best+1])[0]
+        orientations = self.Angles.decode(codes)
+        return {'Codes':half[best],
+                'Orientations':orientations[~np.isnan(orientations)],
+                'Weight':weight[best],
+                'ReserveFactor':reserve[best],
+                'Feasible':bool(reserve[best] >= 1),
+                'History':np.array(history)}
@@ -0,0 +1,179 @@
+"""Vectorized manufacturing design rules for integer coded stacks.
+
+StackingRules checks a whole (candidates x plies) array of DiscreteAngles
+codes at once. Pad codes may sit anywhere, as in the stacking GA. They are
+squeezed out before checking, so every rule sees the real ply sequence.
+Each rule returns a per-candidate violation count, which gives both a
+pass mask and a measure of how badly a candidate misses. Optimizers and
+enumerators can drop the failures before any stiffness or failure
+evaluation.
+"""
+import numpy as np
+import discrete_angles as da
+
+RULES = ('symmetric', 'balanced', 'contiguous', 'fraction', 'jump', 'outer')
+
+def make_balance_signs(angles):
+    """Returns the (codes, pairs) array of +1/-1 memberships of each code in
+    each +/- theta balance pair of a DiscreteAngles alphabet.
+
+    0 and 90 degree plies need no partner. An angle whose negative is not
+    in the alphabet gets a pair of its own, so it can never be balanced.
+    """
+    reduced = (angles.Angles + 90) % 180 - 90
+    pairs = list()
+    for code, angle in enumerate(reduced):
+        if np.isclose(angle, 0) or np.isclose(angle, -90):
+            continue
+        partner = np.flatnonzero(np.isclose(reduced, -angle))
+        if angle > 0 or not partner.size:
+            pairs.append((code, partner[0] if partner.size else None))
+    signs = np.zeros((angles.PadCode, len(pairs)), dtype=int)
+    for col, (plus, minus) in enumerate(pairs):
+        signs[plus, col] = 1
+        if minus is not None:
+            signs[minus, col] = -1
+    return signs
+
+class StackingRules(object):
+    """A configurable rule set over a DiscreteAngles alphabet.
+
+    Rules are switched off by passing None or False:
+    - symmetric: the stack mirrors about its mid-plane.
+    - balanced: as many -theta as +theta plies.
+    - max_contiguous: the most plies of one angle in a row.
+    - min_fraction: the smallest share of plies for each angle listed in
+      directions (all alphabet angles by default).
+    - max_change: adjacent plies may not differ by this many degrees or
+      more, with angle changes measured modulo 180 and so never above 90.
+      The default of 90 forbids 0/90 jumps. A +45/-45 pair also changes by
+      90 degrees, so exempt_pairs (on by default) always allows a +theta
+      ply next to its -theta partner. Set it False to treat such pairs as
+      jumps too.
+    - outer_angles: the allowed angles of both surface plies.
+    """
+
+    def __init__(self, angles, symmetric=True, balanced=True,
+                 max_contiguous=4, min_fraction=0.1, directions=None,
+                 max_change=90.0, exempt_pairs=True, outer_angles=(45, -45)):
+        assert isinstance(angles, da.DiscreteAngles), \
+            'Angles must be a DiscreteAngles table'
+        self.Angles = angles
+        self.Symmetric = symmetric
+        self.Balanced = balanced
+        self.MaxContiguous = max_contiguous
+        self.MinFraction = min_fraction
+        self.MaxChange = max_change
+        self.ExemptPairs = exempt_pairs
+        self.BalanceSign = make_balance_signs(angles)
+
+        reduced = (angles.Angles + 90) % 180 - 90
+        directions = angles.Angles if directions is None else directions
+        self.Directions = angles.encode(directions)
+        self.OuterCodes = None if not outer_angles else \
+                          angles.encode(outer_angles)
+        # Angle change between every pair of codes, folded into [0,90]
+        change = np.abs(reduced[:,None] - reduced[None,:]) % 180
+        self.Change = np.minimum(change, 180 - change)
+        if exempt_pairs:
+            paired = np.isclose(reduced[:,None], -reduced[None,:]) & \
+                     ~np.isclose(np.abs(reduced), 90)[:,None]
+            self.Change[paired] = 0
+
+        self.Active = tuple(name for name, setting in zip(RULES,
+                            (symmetric, balanced, max_contiguous,
+                             min_fraction, max_change, outer_angles)) \
+                            if setting)
+
+    def make_compact(self, codes):
+        """Moves the pad codes of every row to its end, keeping the order of
+        the real plies. Returns the codes and the real ply counts.
+        """
+        codes = np.atleast_2d(np.asarray(codes, dtype=np.uint8))
+        pad = codes == self.Angles.PadCode
+        if not pad.any():
+            return codes, np.full(codes.shape[0], codes.shape[1])
+        order = np.argsort(pad, axis=1, kind='stable')
+        return np.take_along_axis(codes, order, axis=1), (~pad).sum(axis=1)
+
+    def make_violations(self, codes):
+        """Returns a dictionary of (candidates,) violation counts, one entry
+        per active rule.
+
+        Counts are mismatched ply pairs (symmetric), total +/- imbalance
+        (balanced), plies beyond the contiguity limit (contiguous),
+        directions under their minimum share (fraction), forbidden
+        adjacent angle changes (jump) and surfaces with a disallowed ply
+        (outer).
+        """
+        codes, count = self.make_compact(codes)
+        nCand, nPly = codes.shape
+        position = np.arange(nPly)
+        real = position < count[:,None]
+        pad = self.Angles.PadCode
+        violations = dict()
+
+        if 'symmetric' in self.Active:
+            mirror = np.take_along_axis(codes, np.clip(count[:,None] - 1 -
+                                        position, 0, None), axis=1)
+            mismatch = real & (codes != mirror)
+            violations['symmetric'] = mismatch.sum(axis=1) // 2
+
+        counts = np.stack([(codes == code).sum(axis=1) \
+                           for code in range(pad)], axis=-1)
+        if 'balanced' in self.Active:
+            violations['balanced'] = np.abs(counts.dot(self.BalanceSign)
+                                            ).sum(axis=1)
+
+        if 'contiguous' in self.Active:
+            # Length of the run of equal angles ending at each ply
+            start = np.r_[True, np.zeros(nPly-1, dtype=bool)] | \
+                    np.c_[np.ones((nCand,1), dtype=bool),
+                          codes[:,1:] != codes[:,:-1]]
+            last = np.maximum.accumulate(np.where(start, position, 0), axis=1)
+            run = position - last + 1
+            violations['contiguous'] = (real & (run > self.MaxContiguous)
+                                        ).sum(axis=1)
+
+        if 'fraction' in self.Active:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                share = counts[:,self.Directions] / count[:,None]
+            violations['fraction'] = (~(share >= self.MinFraction - 1e-12)
+                                      ).sum(axis=1)
+
+        if 'jump' in self.Active:
+            both = real[:,1:]
+            change = self.Change[np.minimum(codes[:,:-1], pad-1),
+                                 np.minimum(codes[:,1:], pad-1)]
+            violations['jump'] = (both & (change >= self.MaxChange - 1e-9)
+                                  ).sum(axis=1)
+
+        if 'outer' in self.Active:
+            first = codes[:,0]
+            lastPly = codes[np.arange(nCand), np.maximum(count - 1, 0)]
+            violations['outer'] = (~np.isin(first, self.OuterCodes)).astype(int)
+            violations['outer'] += ~np.isin(lastPly, self.OuterCodes)
+        return violations
+
+    def check(self, codes):
+        """Checks every active rule over a (candidates x plies) code array.
+
+        Returns a dictionary with the overall Valid mask, the per rule pass
+        Masks and Violations counts, and Totals giving the number of
+        candidates failing each rule.
+        """
+        violations = self.make_violations(codes)
+        masks = dict((name, count == 0) for name, count in violations.items())
+        valid = np.ones(np.atleast_2d(codes).shape[0], dtype=bool)
+        for mask in masks.values():
+            valid &= mask
+        return {'Valid':valid,
+                'Masks':masks,
+                'Violations':violations,
+                'Totals':dict((name, int((~mask).sum())) \
+                              for name, mask in masks.items())}
+
+    def filter(self, codes):
+        """Returns only the rows of codes that pass every active rule."""
+        codes = np.atleast_2d(codes)
+        return codes[self.check(codes)['Valid']]
@@ -0,0 +1,132 @@
+"""Stiffness of tapered laminates whose zones differ only by dropped plies.
+
+A tapered panel is one master stack laid over the whole part, with some
+plies stopping short in each zone. Every zone is therefore the master with
+a boolean mask of the plies it keeps. The master Q-bar and Q-bar times CTE
+of every ply are built once. Each zone then needs only the cumulative
+sums of its kept ply thicknesses, which give its z-weights about its own
+mid-plane (see batch_plates.make_substack_stiffness). All zones come out
+of a single vectorized call with no Ply objects and no per-zone loop.
+"""
+import numpy as np
+import batch_plates as bp
+import laminate_fundamentals as lf
+
+class TaperedLaminate(object):
+    """A master laminate plus per-zone ply drop masks.
+
+    master is a Laminate or PackedLaminate, listed from the tool side as
+    usual. masks is a (zones, plies) boolean array, True where a zone keeps
+    a master ply. areas gives the zone areas used for the part mass (all
+    ones by default).
+    """
+
+    def __init__(self, master, masks, areas=None):
+        if isinstance(master, lf.Laminate):
+            master = lf.PackedLaminate.from_laminate(master)
+        assert isinstance(master, lf.PackedLaminate), \
+            'Master must be a Laminate or PackedLaminate'
+        self.Master = master
+        self.Masks = np.atleast_2d(np.asarray(masks, dtype=bool))
+        if self.Masks.shape[1] != len(master):
+            raise ValueError('Zone masks need one column per master ply')
+        self.Zones = self.Masks.shape[0]
+        self.Areas = np.ones(self.Zones) if areas is None else \
+                     np.asarray(areas, dtype=float).ravel()
+        if self.Areas.shape != (self.Zones,):
+            raise ValueError('Need one area per zone')
+        self.MaterialTable = bp.make_material_table(master.Materials)
+
+    @classmethod
+    def from_drop_order(cls, master, drop_order, n_plies, areas=None):
+        """Builds the zones of a master dropping its plies in a fixed order.
+
+        drop_order lists the master ply indices, first dropped first, and
+        n_plies the ply count of each zone. A zone with n plies keeps the
+        n plies dropped last, so thinner zones nest inside thicker ones.
+        """
+        if isinstance(master, lf.Laminate):
+            master = lf.PackedLaminate.from_laminate(master)
+        order = np.asarray(drop_order, dtype=np.intp)
+        if not np.array_equal(np.sort(order), np.arange(len(master))):
+            raise ValueError('Drop order must list every master ply once')
+        rank = np.empty_like(order)
+        rank[order] = np.arange(order.size)
+        counts = np.asarray(n_plies, dtype=np.intp).ravel()
+        return cls(master, rank >= order.size - counts[:,None], areas)
+
+    def make_ply_stiffness(self):
+        """Returns the (plies,3,3) Q-bar and (plies,3) Q-bar times CTE of
+        the master stack, built once and shared by every zone.
+        """
+        try:
+            return self.QBar, self.QBarCTE
+        except AttributeError:
+            Q, cte = bp.make_ply_stiffness(self.Master.Orientations,
+                     self.Master.MaterialIndex, self.MaterialTable)
+            self.QBar = Q
+            self.QBarCTE = np.einsum('pij,pj->pi', Q, cte)
+            return self.QBar, self.QBarCTE
+
+    def make_global_stiffness(self):
+        """Returns the (zones,6,6) ABD matrices of every zone. A, B, D and
+        the (zones,3) specificNT are also stored as attributes.
+        """
+        try:
+            return self.ABD
+        except AttributeError:
+            Q, QCTE = self.make_ply_stiffness()
+            ABD, NT = bp.make_substack_stiffness(Q[None], QCTE[None],
+                      self.Master.Thicknesses[None], self.Masks[None])
+            self.ABD = ABD[0]
+            self.specificNT = NT[0]
+            self.A = self.ABD[:,0:3,0:3]
+            self.B = self.ABD[:,0:3,3:]
+            self.D = self.ABD[:,3:,3:]
+            return self.ABD
+
+    def make_zone_thickness(self):
+        """Returns the total thickness of every zone."""
+        return self.Masks.dot(self.Master.Thicknesses)
+
+    def make_zone_weight(self):
+        """Returns the areal weight of every zone."""
+        return self.Masks.dot(self.Master.Thicknesses *
+                              self.Master.make_densities())
+
+    def make_mass(self):
+        """Returns the mass of the whole tapered part."""
+        return float(self.make_zone_weight().dot(self.Areas))
+
+    def make_effective_properties(self):
+        """Returns the batch_plates.make_effective_properties dictionary with
+        one value per zone.
+        """
+        ABD = self.make_global_stiffness()
+        return bp.make_effective_properties(ABD, self.make_zone_thickness(),
+                                            self.specificNT)
+
+    def make_zone_results(self):
+        """Returns a dictionary of per-zone A, B, D, ABD, specificNT, Plies,
+        Thickness, Weight (areal) and Mass, with the part TotalMass.
+        """
+        ABD = self.make_global_stiffness()
+        weight = self.make_zone_weight()
+        return {'A':self.A,
+                'B':self.B,
+                'D':self.D,
+                'ABD':ABD,
+                'specificNT':self.specificNT,
+                'Plies':self.Masks.sum(axis=1),
+                'Thickness':self.make_zone_thickness(),
+                'Weight':weight,
+                'Mass':weight * self.Areas,
+                'TotalMass':float(weight.dot(self.Areas))}
+
+    def make_zone_laminate(self, zone):
+        """Returns the PackedLaminate of one zone."""
+        keep = self.Masks[zone]
+        return lf.PackedLaminate(self.Master.Orientations[keep],
+                                 self.Master.Thicknesses[keep],
+                                 self.Master.MaterialIndex[keep],
+                                 self.Master.Materials)
@@ -0,0 +1,32 @@
+"""Checks design sweep strength against a ply by ply ThinPlates analysis."""
+import numpy as np
+import design_sweep as ds
+import layup_templates as lt
+import thin_plates as tp
+
+MATERIAL = {'name':'AS4', 'thk':0.0074, 'dens':0.057, 'E11':19.09e6,
+            'E22':1.34e6, 'Nu12':0.335, 'G12':0.70e6, 'f1t':279.61e3,
+            'f1c':215.29e3, 'f2t':9.27e3, 'f2c':38.85e3, 'f12s':13.28e3,
+            'CTE_1':-0.2e-6, 'CTE_2':16e-6, 'e1t':0.012, 'e1c':0.010,
+            'e2t':0.006, 'e2c':0.02, 'e12s':0.02}
+
+def test_reserve_matches_expanded_stack_under_moments():
+    matl = tp.Plate2D(MATERIAL)
+    template = lt.make_amn_template(matl)
+    loads = np.zeros((6,4))
+    loads[3,0] = 5
+    loads[5,1] = 3
+    loads[:,2] = [200, -100, 50, 2, -1, 0.5]
+    loads[4,3] = -4
+    grids = {'a':[30, 45], 'm':[1, 10, 30], 'n':[2, 5, 10]}
+    for criterion in ('hoffman', 'maxstress', 'tsaiwu'):
+        sweep = ds.DesignSweep(template, grids, loads=loads,
+                               criterion=criterion)
+        reserve = sweep.evaluate()['ReserveFactor']
+        for index in np.ndindex(sweep.Shape):
+            params = dict((name, sweep.Coords[name][idx]) \
+                          for name, idx in zip(sweep.Dims, index))
+            plate = tp.ThinPlates(template.make_laminate(**params))
+            expected = plate.make_reserve_factors(loads, criterion)
+            np.testing.assert_allclose(reserve[index],
+                                       expected['ReserveFactor'], rtol=1e-9)
@@ -0,0 +1,44 @@
+"""Checks edited laminates against a fresh ThinPlates analysis."""
+import numpy as np
+import laminate_editor as le
+import laminate_fundamentals as lf
+import thin_plates as tp
+
+MATERIAL = {'name':'AS4', 'thk':0.0074, 'dens':0.057, 'E11':19.09e6,
+            'E22':1.34e6, 'Nu12':0.335, 'G12':0.70e6, 'f1t':279.61e3,
+            'f1c':215.29e3, 'f2t':9.27e3, 'f2c':38.85e3, 'f12s':13.28e3,
+            'CTE_1':-0.2e-6, 'CTE_2':16e-6, 'e1t':0.012, 'e1c':0.010,
+            'e2t':0.006, 'e2c':0.02, 'e12s':0.02}
+
+def test_random_edits_match_fresh_analysis():
+    matl = tp.Plate2D(MATERIAL)
+    fabric = dict(MATERIAL, name='fabric', E11=8e6, E22=7.5e6, G12=0.6e6)
+    materials = [matl, tp.Plate2D(fabric)]
+    rng = np.random.default_rng(11)
+    editor = le.LaminateEditor(lf.PackedLaminate(
+             rng.choice([0, 45, -45, 90], 12), 0.0074,
+             rng.integers(0, 2, 12), materials))
+    for step in range(300):
+        n = len(editor.Thicknesses)
+        ply = int(rng.integers(0, n))
+        edit = rng.integers(0, 5)
+        if edit == 0:
+            editor.set_orientation(ply, rng.uniform(-90, 90))
+        elif edit == 1:
+            editor.set_thickness(ply, rng.uniform(0.002, 0.02))
+        elif edit == 2:
+            editor.swap_plies(ply, int(rng.integers(0, n)))
+        elif edit == 3 or n < 4:
+            editor.insert_ply(int(rng.integers(0, n+1)), rng.uniform(-90, 90),
+                              rng.uniform(0.002, 0.02), int(rng.integers(0, 2)))
+        else:
+            editor.delete_ply(ply)
+
+        plate = tp.ThinPlates(editor.to_packed())
+        scale = np.abs(plate.ABD).max()
+        np.testing.assert_allclose(editor.ABD, plate.ABD, rtol=0,
+                                   atol=1e-9*scale)
+        np.testing.assert_allclose(editor.specificNT, plate.specificNT,
+                                   rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(editor.TotalThickness,
+                                   plate.TotalThickness, rtol=1e-12)
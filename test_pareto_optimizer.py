@@ -0,0 +1,51 @@
+"""Checks the non-dominated sort against a brute force front peeling."""
+import numpy as np
+import pareto_optimizer as po
+
+def make_brute_ranks(objectives):
+    # Peel off the non-dominated front, comparing every pair
+    rank = np.full(objectives.shape[0], -1)
+    front = 0
+    while (rank < 0).any():
+        left = np.flatnonzero(rank < 0)
+        points = objectives[left]
+        dominated = np.any(np.all(points[:,None,:] <= points[None,:,:], axis=-1)
+                           & np.any(points[:,None,:] < points[None,:,:],
+                                    axis=-1), axis=0)
+        rank[left[~dominated]] = front
+        front += 1
+    return rank
+
+def test_ranks_match_brute_force():
+    rng = np.random.default_rng(7)
+    for nObj in (1, 2, 3, 4):
+        for nSol, levels in ((1, 5), (2, 2), (40, 3), (300, 6), (600, 1000)):
+            objectives = rng.integers(0, levels, (nSol, nObj)).astype(float)
+            np.testing.assert_array_equal(
+                po.make_nondominated_ranks(objectives),
+                make_brute_ranks(objectives))
+
+def test_single_front_and_infinite_rows():
+    # Points on a line are all non-dominated, infinite rows come last
+    x = np.linspace(0, 1, 500)
+    objectives = np.stack([x, 1 - x, np.sin(7*x)], axis=-1)
+    objectives[::50] = np.inf
+    np.testing.assert_array_equal(po.make_nondominated_ranks(objectives),
+                                  make_brute_ranks(objectives))
+
+def test_continuous_objectives():
+    rng = np.random.default_rng(3)
+    objectives = rng.random((800, 3))
+    objectives[:,2] = objectives[:,0] + objectives[:,1] + \
+                      0.1*rng.random(800)
+    np.testing.assert_array_equal(po.make_nondominated_ranks(objectives),
+                                  make_brute_ranks(objectives))
+
+def test_selection_orders_by_front_then_crowding():
+    # The crowded rank 0 duplicate must still come before every rank 1 point
+    objectives = np.array([[0,1], [0,1], [0,1], [1,0], [2,-1], [1,1.5],
+                           [0.5,3]], dtype=float)
+    keep, key, rank = po.ParetoStackingGA.make_selection(None, objectives, 7)
+    np.testing.assert_array_equal(rank[keep], np.sort(rank))
+    np.testing.assert_array_equal(keep[:5], [0, 2, 4, 3, 1])
+    np.testing.assert_array_equal(np.argsort(key), keep)
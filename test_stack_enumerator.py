@@ -0,0 +1,41 @@
+"""Checks the stack enumerator against a brute force over all sequences."""
+import numpy as np
+import discrete_angles as da
+import stack_enumerator as se
+import stacking_rules as sr
+import thin_plates as tp
+
+MATERIAL = {'name':'AS4', 'thk':0.0074, 'dens':0.057, 'E11':19.09e6,
+            'E22':1.34e6, 'Nu12':0.335, 'G12':0.70e6, 'f1t':279.61e3,
+            'f1c':215.29e3, 'f2t':9.27e3, 'f2c':38.85e3, 'f12s':13.28e3,
+            'CTE_1':-0.2e-6, 'CTE_2':16e-6, 'e1t':0.012, 'e1c':0.010,
+            'e2t':0.006, 'e2c':0.02, 'e12s':0.02}
+
+def make_brute_stacks(angles, n_plies, symmetric, balanced):
+    # Every sequence, filtered, with each stack and its reversal kept once
+    codes = np.indices((angles.PadCode,)*n_plies).reshape(n_plies, -1).T
+    if symmetric:
+        codes = codes[np.all(codes == codes[:,::-1], axis=1)]
+    if balanced:
+        counts = np.stack([(codes == code).sum(axis=1) \
+                           for code in range(angles.PadCode)], axis=-1)
+        signs = sr.make_balance_signs(angles)
+        codes = codes[~np.any(counts.dot(signs), axis=1)]
+    canonical = [min(tuple(row), tuple(row[::-1])) for row in codes]
+    return sorted(set(canonical))
+
+def test_stacks_match_brute_force():
+    matl = tp.Plate2D(MATERIAL)
+    for alphabet in ((0, 45, -45, 90), (0, 30, 45, -45)):
+        angles = da.DiscreteAngles(alphabet, [matl])
+        for nPly in range(1, 8):
+            for symmetric in (True, False):
+                for balanced in (True, False):
+                    enumerator = se.StackEnumerator(angles, nPly, symmetric,
+                                                    balanced)
+                    stacks = [tuple(row) for block in
+                              enumerator.make_chunks(chunk=97)
+                              for row in block.tolist()]
+                    assert len(stacks) == len(set(stacks))
+                    assert sorted(stacks) == make_brute_stacks(angles, nPly,
+                                             symmetric, balanced)
@@ -0,0 +1,30 @@
+"""Checks the branch and bound optimum against full enumeration."""
+import numpy as np
+import discrete_angles as da
+import stack_enumerator as se
+import stacking_bnb as sb
+import thin_plates as tp
+
+MATERIAL = {'name':'AS4', 'thk':0.0074, 'dens':0.057, 'E11':19.09e6,
+            'E22':1.34e6, 'Nu12':0.335, 'G12':0.70e6, 'f1t':279.61e3,
+            'f1c':215.29e3, 'f2t':9.27e3, 'f2c':38.85e3, 'f12s':13.28e3,
+            'CTE_1':-0.2e-6, 'CTE_2':16e-6, 'e1t':0.012, 'e1c':0.010,
+            'e2t':0.006, 'e2c':0.02, 'e12s':0.02}
+
+def test_optimum_matches_enumeration():
+    matl = tp.Plate2D(MATERIAL)
+    angles = (0, 45, -45, 90)
+    rng = np.random.default_rng(5)
+    # The search is symmetric only, so compare with unbalanced stacks
+    enumerator = se.StackEnumerator(da.DiscreteAngles(angles, [matl]), 8,
+                                    balanced=False)
+    for trial in range(3):
+        loads = rng.normal(size=(6,2)) * np.array([[1000]]*3 + [[5]]*3)
+        for criterion in ('hoffman', 'tsaiwu', 'maxstress', 'maxstrain',
+                          'tsaihill'):
+            search = sb.StackingBranchAndBound(matl, loads, 8, angles,
+                                               criterion).run()
+            best = enumerator.make_best(loads, 1, criterion)
+            assert search['Optimal']
+            np.testing.assert_allclose(search['ReserveFactor'],
+                                       best['ReserveFactor'][0], rtol=1e-9)
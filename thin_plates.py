@@ -1,7 +1,12 @@
 import warnings
 import numpy as np
+import scipy.linalg as sla
 import property_interface
 import laminate_fundamentals as lf
+import batch_plates as bp
+import lamination_parameters as lp
+import failure_criteria as fc
+import progressive_failure as pf
 
 class Plate2D(property_interface.Material):
     """A plate material for use in classical laminated plate theory (CLPT).
@@ -80,6 +85,9 @@ class Plate2D(property_interface.Material):
             return self.Compliance
 
     def make_stiffness(self):
+        try:
+            return self.Stiffness
+        except AttributeError:
             self.Stiffness = self.make_compliance().I
             return self.Stiffness
 
@@ -112,62 +120,72 @@ class ThinPlates(property_interface.Properties):
         property_interface.Properties.__init__(self,lam)
 
     def make_global_stiffness(self):
-        """Builds ABD matrix ply by ply, and returns the augmented ABD matrix.
+        """Builds ABD matrix from the ply arrays, and returns the augmented ABD
+        matrix.
 
         In CLPT the concept of a stiffness matrix is hard to define by itself.
         The closest representation is the A matrix, but is not useful in cases
         where there is substantial bending. Instead, the full ABD matrix is
         returned to the user.
 
+        Symmetric laminates only integrate the upper half of the stack and
+        have B set to exactly zero. Symmetry is always checked on the stack
+        itself rather than taken from the symmetry flag. Balanced laminates
+        have the A16, A26 and shear NT terms set to exactly zero.
+
         This function also generates thermal and dynamic properties.
         """
         try:
             return self.ABD
         except AttributeError:
-            self.A = np.matrix( np.zeros((3,3)) )
-            self.B = np.matrix( np.zeros((3,3)) )
-            self.D = np.matrix( np.zeros((3,3)) )
-            self.ABD = np.matrix( np.zeros((6,6)) )
-            self.specificNT = np.matrix( np.zeros((3,1)) )
-
-            zLow = -self.TotalThickness / 2
-
-            # Build global stiffness ply by ply, then add to the ABD matrix.
-            # Invariant method is used to ensure matrix symetry in the final result.
-            for ply in self.Laminate.PlyStack:
-                zUp = zLow + ply.Thickness
-                U = ply.Material.make_invariants()
-                c4 = np.cos(4 * np.radians(ply.Orientation))
-                c2 = np.cos(2 * np.radians(ply.Orientation))
-                c1 = np.cos(1 * np.radians(ply.Orientation))
-                s4 = np.sin(4 * np.radians(ply.Orientation))
-                s2 = np.sin(2 * np.radians(ply.Orientation))
-                s1 = np.sin(1 * np.radians(ply.Orientation))
-
-                Q11 = U[0] + U[1]*c2 + U[2]*c4
-                Q22 = U[0] - U[1]*c2 + U[2]*c4
-                Q12 = U[3] - U[2]*c4
-                Q66 = U[4] - U[2]*c4
-                Q16 = U[1]*s2/2 + U[2]*s4
-                Q26 = U[1]*s2/2 - U[2]*s4
-                cte_x = ply.Material.CTE_1*c1**2 + ply.Material.CTE_2*s1**2
-                cte_y = ply.Material.CTE_1*s1**2 + ply.Material.CTE_2*c1**2
-                cte_xy = (ply.Material.CTE_2-ply.Material.CTE_1)*c1*s1
-
-                ply.GlobalStiffness = np.matrix([
-                [Q11, Q12, Q16], \
-                [Q12, Q22, Q26], \
-                [Q16, Q26, Q66]])
-                ply.GlobalCTE = np.matrix([[cte_x],[cte_y],[cte_xy]])
-
-                self.A += ply.GlobalStiffness * (zUp - zLow)
-                self.B += ply.GlobalStiffness * (zUp**2 - zLow**2) / 2
-                self.D += ply.GlobalStiffness * (zUp**3 - zLow**3) / 3
-                self.specificNT += ply.GlobalStiffness * ply.GlobalCTE * (zUp - zLow)
-
-                # Increment Z
-                zLow = zUp
+            self.Symmetric = self.Packed.check_symmetry()
+            assert self.Symmetric or not self.Packed.Symmetry, \
+                'Laminate is declared symmetric but its stack is not'
+            self.Balanced = self.Packed.check_balance()
+            self.MaterialTable = bp.make_material_table(self.Packed.Materials)
+            nPly = len(self.Packed)
+
+            if self.Symmetric:
+                # Integrate from the mid-plane up. An odd middle ply only
+                # counts its upper half, then everything is doubled.
+                half = nPly // 2
+                thk = self.Packed.Thicknesses[half:].copy()
+                if nPly % 2:
+                    thk[0] = thk[0] / 2
+                zUp = np.cumsum(thk)
+                zLow = zUp - thk
+                h = np.stack([2*thk, np.zeros_like(thk),
+                              2*(zUp**3 - zLow**3)/3])
+                plies = slice(half, nPly)
+            else:
+                h = bp.make_z_weights(self.Packed.Thicknesses)[:,0,:]
+                plies = slice(0, nPly)
+
+            # Global stiffness and CTE of each ply are built in one go from
+            # the packed ply arrays. Invariant method is used to ensure
+            # matrix symetry in the final result.
+            Q, cte = bp.make_ply_stiffness(self.Packed.Orientations[plies],
+                     self.Packed.MaterialIndex[plies], self.MaterialTable)
+
+            self.A = np.matrix(np.einsum('p,pij->ij', h[0], Q))
+            self.D = np.matrix(np.einsum('p,pij->ij', h[2], Q))
+            self.specificNT = np.matrix(np.einsum('p,pij,pj->i', h[0], Q, cte)).T
+            if self.Symmetric:
+                self.B = np.matrix( np.zeros((3,3)) )
+                # Mirror the half stack back out to every ply position
+                pos = np.arange(nPly)
+                mirror = np.maximum(pos, nPly-1-pos) - plies.start
+                self.PlyStiffness = Q[mirror]
+                self.PlyCTE = cte[mirror]
+            else:
+                self.B = np.matrix(np.einsum('p,pij->ij', h[1], Q))
+                self.PlyStiffness = Q
+                self.PlyCTE = cte
+            if self.Balanced:
+                self.A[0,2] = self.A[2,0] = self.A[1,2] = self.A[2,1] = 0
+                self.specificNT[2,0] = 0
 
+            self.ABD = np.matrix( np.zeros((6,6)) )
             self.ABD[0:3,0:3] = self.A
             self.ABD[0:3,3:] = self.B
             self.ABD[3:,0:3] = self.B
@@ -179,9 +197,73 @@ class ThinPlates(property_interface.Properties):
 
         This is also a tricky one to define for CLPT laminates. For similar
         reasons to make_global_stiffness this returns the inveted ABD matrix
-        instead of just the global compliance matrix.
+        instead of just the global compliance matrix. The inverse is only
+        formed when this is called, by solving against the factorized ABD.
+        """
+        try:
+            return self.GlobalCompliance
+        except AttributeError:
+            self.GlobalCompliance = np.matrix(self.solve_resultants(np.eye(6)))
+            return self.GlobalCompliance
+
+    def make_factorization(self):
+        """Factorizes the ABD matrix once, and returns the factors.
+
+        ABD is symmetric, so a Cholesky factorization is used, falling back to
+        LU should a non positive definite material make that fail. Symmetric
+        laminates are decoupled, so the 3x3 A and D are factorized on their
+        own instead. The result is a list of (rows, kind, factor) tuples.
+        """
+        try:
+            return self.Factorization
+        except AttributeError:
+            ABD = np.asarray(self.make_global_stiffness())
+            if self.Symmetric:
+                blocks = [slice(0,3), slice(3,6)]
+            else:
+                blocks = [slice(0,6)]
+
+            self.Factorization = list()
+            for rows in blocks:
+                try:
+                    factor = ('cholesky', sla.cho_factor(ABD[rows,rows]))
+                except np.linalg.LinAlgError:
+                    factor = ('lu', sla.lu_factor(ABD[rows,rows]))
+                self.Factorization.append((rows,) + factor)
+            return self.Factorization
+
+    def solve_resultants(self, resultants):
+        """Returns the mid-plane strains and curvatures for one or many sets
+        of force and moment resultants.
+
+        resultants is a 6 vector or a (6,M) block with one load case per
+        column. All columns are solved together against the stored
+        factorization, and a plain array of the same shape is returned.
+        """
+        rhs = np.asarray(resultants, dtype=float)
+        strains = np.empty(rhs.shape)
+        for rows, kind, factor in self.make_factorization():
+            if kind == 'cholesky':
+                strains[rows] = sla.cho_solve(factor, rhs[rows])
+            else:
+                strains[rows] = sla.lu_solve(factor, rhs[rows])
+        return strains
+
+    def make_lamination_parameters(self):
+        """Returns the 12 lamination parameters of the laminate as an array.
+
+        Lamination parameters only describe single material laminates, so
+        anything else raises a ValueError.
         """
-        return self.make_global_stiffness().I
+        try:
+            return self.LaminationParameters
+        except AttributeError:
+            if len(self.Packed.Materials) != 1:
+                raise ValueError('Lamination parameters need a single material')
+            params, _ = lp.make_lamination_parameters(
+                        self.Packed.Orientations, self.Packed.Thicknesses)
+            self.LaminationParameters = params[0]
+            return self.LaminationParameters
 
     def make_effective_properties(self):
         """Returns a dictionary containing overall laminate properties. This
@@ -193,7 +275,8 @@ class ThinPlates(property_interface.Properties):
         try:
             return self.EffectiveProperties
         except AttributeError:
-            effective_compliance = self.make_global_compliance()[0:3,0:3]
+            effective_compliance = np.matrix(
+                self.solve_resultants(np.eye(6)[:,0:3])[0:3])
             Exx = 1 / (effective_compliance[0,0] * self.TotalThickness)
             Eyy = 1 / (effective_compliance[1,1] * self.TotalThickness)
             Gxy = 1 / (effective_compliance[2,2] * self.TotalThickness)
@@ -222,110 +305,181 @@ class ThinPlates(property_interface.Properties):
     def make_strains_from_stress(self, resultants):
         """Calculate global mid-plane strains and curvatures given force and
         moment resultants (through thickness integrated stress) augmented as a
-        single vector.
+        single vector. A (6,M) block of load cases is also accepted, and a
+        single vector comes back as a (6,1) column.
         """
-        self.Resultants = resultants
-        self.StrainsCurves = self.ABD.I * self.Resultants
+        resultants = np.asarray(resultants, dtype=float).reshape(6,-1)
+        self.Resultants = np.matrix(resultants)
+        self.StrainsCurves = np.matrix(self.solve_resultants(resultants))
         return self.StrainsCurves
 
     def make_stress_from_strains(self, strains_curves):
         """Calculate global thickness integrated stresses (resultants) from
         global midsurface strains and curvatures.
         """
-        self.StrainsCurves = strains_curves
+        self.StrainsCurves = np.matrix(np.asarray(strains_curves,
+                                       dtype=float).reshape(6,-1))
         self.Resultants = self.ABD * self.StrainsCurves
         return self.Resultants
 
+    def make_ply_transforms(self):
+        """Precomputes everything ply recovery needs, once per laminate.
+
+        Returns a dictionary of the strain transformation matrices from
+        global to fibre coordinates, the fibre coordinate ply stiffnesses and
+        the bottom, mid and top z-coordinate of every ply. Shear strains are
+        engineering strains throughout.
+        """
+        try:
+            return self.PlyTransforms
+        except AttributeError:
+            T = bp.make_strain_transforms(self.Packed.Orientations)
+            stiffness = np.array([np.asarray(matl.make_stiffness()) \
+                                  for matl in self.Packed.Materials])
+            zUp = np.cumsum(self.Packed.Thicknesses) - self.TotalThickness/2
+            zLow = zUp - self.Packed.Thicknesses
+
+            self.PlyTransforms = {'T':T,
+                                  'Q':stiffness[self.Packed.MaterialIndex],
+                                  'bottom':zLow,
+                                  'mid':(zLow+zUp)/2,
+                                  'top':zUp}
+            return self.PlyTransforms
+
+    def make_ply_stress_strain_cases(self, resultants=None, strains_curves=None,
+                                     location='mid'):
+        """Determines the stress and strain in each ply for many load cases.
+
+        Either a (6,M) block of resultants or of mid-plane strains and
+        curvatures is given, one load case per column. location picks the
+        ply 'bottom', 'mid' or 'top' surface. Returns contiguous stress and
+        strain arrays of shape (M, plies, 3) in fibre coordinates, with
+        engineering shear strain.
+        """
+        transforms = self.make_ply_transforms()
+        if strains_curves is None:
+            strains_curves = self.solve_resultants(resultants)
+        strains_curves = np.asarray(strains_curves, dtype=float).reshape(6,-1)
+
+        z = transforms[location]
+        globalStrain = strains_curves[:3].T[:,None,:] + \
+                       z[None,:,None] * strains_curves[3:].T[:,None,:]
+        strain_array = np.ascontiguousarray(np.einsum('pij,mpj->mpi',
+                       transforms['T'], globalStrain))
+        stress_array = np.ascontiguousarray(np.einsum('pij,mpj->mpi',
+                       transforms['Q'], strain_array))
+        return (stress_array, strain_array)
+
     def make_ply_stress_strain(self, resultants=None, strain=None):
         """Using the global strains, determines the stress and strains in each
         ply of the laminate.
 
         This function returns arrays of stress and strain in fibre coordinates
-        on a ply by ply basis.
+        on a ply by ply basis, evaluated at the ply mid-surface. The arrays
+        are kept in PlyStress and PlyStrain. Results are not stored within
+        each ply because repeated and mirrored plies share the same Ply
+        object.
+        """
+        if strain is not None:
+            self.make_stress_from_strains(strain)
+        elif resultants is not None:
+            self.make_strains_from_stress(resultants)
+        elif not hasattr(self, 'StrainsCurves'):
+            raise ValueError('Give resultants or strains, no load has been '
+                             'applied to this laminate yet')
+
+        stress_array, strain_array = self.make_ply_stress_strain_cases(
+            strains_curves=self.StrainsCurves[:,0])
+        self.PlyStress = stress_array[0]
+        self.PlyStrain = strain_array[0]
+        return (self.PlyStress, self.PlyStrain)
+
+    def make_allowables(self):
+        """Returns the dictionary of per-ply allowable arrays used by the
+        failure criteria.
         """
         try:
-            midStrains = self.StrainsCurves[:3,0]
-            midCurves = self.StrainsCurves[3:,0]
+            return self.Allowables
         except AttributeError:
-            if not strain==None:
-                self.make_stress_from_strains(strain)
-            elif not stress==None:
-                self.make_strains_from_stress(resultants)
-            midStrains = self.StrainsCurves[:3,0]
-            midCurves = self.StrainsCurves[3:,0]
-
-        stress_array = np.zeros((len(self.Laminate.PlyStack),3))
-        strain_array = np.zeros((len(self.Laminate.PlyStack),3))
-        counter = 0
-
-        zLow = -self.TotalThickness / 2
-        for ply in self.Laminate.PlyStack:
-            m = np.cos(np.radians(ply.Orientation))
-            n = np.sin(np.radians(ply.Orientation))
-            T = np.matrix([\
-            [m**2, n**2, 2*m*n],\
-            [n**2, m**2, -2*m*n],\
-            [-m*n, m*n, m**2-n**2]])
-
-            zUp = zLow + ply.Thickness
-            # Uses ply mid-surface to determine state of each ply.
-            globalStrain = midStrains + (zUp+zLow)/2*midCurves
-            globalStrain[2,0] = globalStrain[2,0]/2 #Convert gamma to epsilon
-
-            ply.Strain = T * globalStrain
-            ply.Stress = ply.Material.Compliance.I * ply.Strain
-            zLow=zUp
-
-            stress_array[counter,:] = ply.Stress
-            strain_array[counter,:] = ply.Strain
-
-        return (stress_array, strain_array)
+            self.Allowables = fc.make_allowables(self.Packed.Materials,
+                                                 self.Packed.MaterialIndex)
+            return self.Allowables
 
     def make_failure_index(self, type='hoffman'):
-        index = list()
-
-        for ply in self.Laminate.PlyStack:
-            s1 = ply.Stress[0,0]
-            s2 = ply.Stress[1,0]
-            s12 = ply.Stress[2,0]
-            eps1 = ply.Strain[0,0]
-            eps2 = ply.Strain[1,0]
-            eps12 = ply.Strain[2,0]
-
-            if type=='hoffman':
-                f1t = ply.Material.f1t
-                f1c = ply.Material.f1c
-                f2t = ply.Material.f2t
-                f2c = ply.Material.f2c
-                f12s = ply.Material.f12s
-                ply.HoffmanFail = -s1**2/(f1t*f1c) + s1*s2/(f1t*f1c) \
-                                -s2**2/(f2t*f2c) + s1*(1/f1t+1/f1c) \
-                                +s2*(1/f2t+1/f2c) + (s12/f12s)**2
-                index.append(ply.HoffmanFail)
-
-            elif type=='tsaihill':
-                f1 = ply.Material.f1t*(s1>=0) + ply.Material.f1c*(s1<0)
-                f2 = ply.Material.f2t*(s2>=0) + ply.Material.f2c*(s2<0)
-                f12 = ply.Material.f12s
-                ply.TsaiHillFail = (s1/f1)**2 + (s2/f2)**2 + (s12/f12)**2 \
-                                   -s1*s2/(f1**2)
-                index.append(ply.TsaiHillFail)
-
-            elif type=='maxstress':
-                f1 = ply.Material.f1t*(s1>=0) + ply.Material.f1c*(s1<0)
-                f2 = ply.Material.f2t*(s2>=0) + ply.Material.f2c*(s2<0)
-                f12 = ply.Material.f12s
-                ply.MaxStressFail = [s1/f1, s2/f2, s12/f12]
-                index.append(ply.MaxStressFail)
-
-            elif type=='maxstrain':
-                e1 = ply.Material.e1t*(e1>=0) + ply.Material.e1c*(e1<0)
-                e2 = ply.Material.e2t*(e2>=0) + ply.Material.e2c*(e2<0)
-                e12 = ply.Material.e12s
-                ply.MaxStrainFail = [eps1/e1, eps2/e2, eps12/e12]
-                index.append(ply.MaxStrainFail)
-
-        return np.array(index)
+        """Returns the failure index of each ply for the current ply stresses
+        and strains, according to the criterion named by type.
+
+        Any criterion in failure_criteria.CRITERIA may be used. The failure
+        mode code of each ply is kept in PlyFailureMode.
+        """
+        index, mode = fc.make_failure_indices(self.PlyStress, self.PlyStrain,
+                                              self.make_allowables(), type)
+        self.PlyFailureMode = mode
+        return index
+
+    def make_failure_cases(self, resultants, criterion='hoffman',
+                           location='mid'):
+        """Evaluates first ply failure for a (6,M) block of resultants.
+
+        Returns the failure_criteria.evaluate_failure dictionary: the
+        governing Index, Ply and Mode of each load case plus the full
+        (M, plies) PlyIndex and PlyMode arrays.
+        """
+        stress, strain = self.make_ply_stress_strain_cases(resultants,
+                                                           location=location)
+        return fc.evaluate_failure(stress, strain, self.make_allowables(),
+                                   criterion)
+
+    def make_failure_forms(self, criterion='hoffman', location='mid'):
+        """Compiles a failure criterion into per-ply forms in resultant space.
+
+        The maps from resultants to the fibre stress and strain of every ply
+        are built once from the ABD factorization, then reduced to the forms
+        of failure_criteria.make_load_forms. Forms are cached per criterion
+        and ply location.
+        """
+        try:
+            forms = self.FailureForms
+        except AttributeError:
+            forms = self.FailureForms = dict()
+        try:
+            return forms[(criterion, location)]
+        except KeyError:
+            transforms = self.make_ply_transforms()
+            compliance = self.solve_resultants(np.eye(6))
+            z = transforms[location]
+            # Global strain at z in terms of the mid-plane strains and curves
+            lever = np.zeros((len(self.Packed),3,6))
+            lever[:,:,0:3] = np.eye(3)
+            lever[:,:,3:] = z[:,None,None] * np.eye(3)
+            strain_map = np.einsum('pij,pjk,kl->pil', transforms['T'], lever,
+                                   compliance)
+            stress_map = np.einsum('pij,pjl->pil', transforms['Q'], strain_map)
+            forms[(criterion, location)] = fc.make_load_forms(stress_map,
+                self.make_allowables(), criterion, strain_map)
+            return forms[(criterion, location)]
+
+    def make_reserve_factors(self, resultants, criterion='hoffman',
+                             location='mid'):
+        """Returns the first ply failure load factor of each load case in a
+        (6,M) block of resultants, as an exact root of the compiled forms.
+
+        See failure_criteria.make_reserve_factors for the dictionary returned.
+        """
+        return fc.make_reserve_factors(self.make_failure_forms(criterion,
+                                       location), resultants)
+
+    def make_progressive_failure(self, resultants, criterion='hoffman',
+                                 residual=1e-6):
+        """Runs a progressive failure analysis of this laminate along the load
+        direction given by a 6 vector of resultants.
+
+        See progressive_failure.make_progressive_failure for the dictionary
+        returned, with a single laminate in it.
+        """
+        return pf.make_progressive_failure(self.Packed.Orientations,
+               self.Packed.Thicknesses, self.Packed.MaterialIndex,
+               self.Packed.Materials, resultants, criterion, residual)
 
 if __name__=="__main__":
     matl_dict = {'name':'AS4-8552-UNI',